@@ -6,6 +6,7 @@ from ttkwidgets.autocomplete import AutocompleteEntry
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg, NavigationToolbar2Tk)
 from numpy import genfromtxt
 from interpolateDynamics import *
+from trajecData import buildTrajecCache
 from matplotlib.offsetbox import AnchoredText
 import dataclasses
     
@@ -459,6 +460,7 @@ class dynamicsGUI():
     def load_callback(self):
         self.task = self.entry_tasks.get()
         self.trajectoryNumber = int(self.entry_trajecNum.get())
+        buildTrajecCache(self.task, [self.trajectoryNumber])
         self.interpolator = interpolator(self.task, self.trajectoryNumber)
         self.dof_pos = self.interpolator.dof_pos
         self.dof_vel = self.interpolator.dof_vel
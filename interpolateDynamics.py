@@ -2,9 +2,16 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.signal import butter,filtfilt
+from scipy.interpolate import PchipInterpolator, CubicSpline
 import math
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+import heapq
+import os
 import yaml
+from trajecData import (TRAJEC_COMPONENTS, returnTaskDescriptor, validateTrajec, loadTrajecComponent, loadTrajecComponents,
+                        readTrajecChunks, trajecComponentShape)
 
 @dataclass
 class derivative_interpolator():
@@ -15,179 +22,586 @@ class derivative_interpolator():
     jerkThreshold: float
     iterative_error_threshold: float
     vel_change_required: float
+    # iterativeErrorPriority only - maximum number of keypoints summed over all dofs, None for no limit
+    keyPoint_budget: int = None
+    # Kernel used between keypoints, one of INTERPOLATION_METHODS
+    interpolation_method: str = "linear"
+
+def minSteps(dynParameters):
+    '''
+    minN and maxN of a parameter set as whole numbers of steps. The keypoint counters only take
+    integer values, so counter >= minN is counter >= ceil(minN), and the same for maxN.
+
+    '''
+    return int(np.ceil(dynParameters.minN)), int(np.ceil(dynParameters.maxN))
+
+# Piecewise linear, piecewise cubic Hermite (monotone PCHIP slopes) and natural cubic spline
+INTERPOLATION_METHODS = ("linear", "cubicHermite", "naturalCubicSpline")
+
+def unpackMatrices(flatMatrices, numRows, numCols):
+    '''
+    Unpack a (T, numRows * numCols) array of row-major flattened matrices into a
+    (T, numRows, numCols) tensor. When the flattened data is C-contiguous the returned
+    tensor is a view onto it and no data is copied.
+
+    '''
+    flatMatrices = flatMatrices[:, :numRows * numCols]
+    return flatMatrices.reshape((len(flatMatrices), numRows, numCols))
+
+class sparseMatrices():
+    '''
+    A trajectory of matrices split into the entries that change over the trajectory and the ones
+    that are constant over the whole of it (structural zeros, identity and dt blocks), so the
+    interpolation and error only have to be computed for the changing entries. It is built from,
+    and held next to, the dense matrices: when every entry changes (as in the bundled tasks) values
+    is a view onto the dense data, otherwise a copy of just the changing entries.
+
+    values:         (T, nnz) the time-varying entries
+    rowIndices:     (nnz,) matrix row of every time-varying entry
+    colIndices:     (nnz,) matrix column of every time-varying entry
+    constantValues: (rows * cols,) the flattened constant entries, time-varying ones hold their t = 0 value
+
+    '''
+    def __init__(self, flatMatrices, numRows, numCols):
+        flatMatrices = flatMatrices[:, :numRows * numCols]
+        self.trajecLength = len(flatMatrices)
+        self.numRows = numRows
+        self.numCols = numCols
+
+        varying = np.any(flatMatrices != flatMatrices[0], axis=0)
+        self.entryIndices = np.flatnonzero(varying)
+        self.constantIndices = np.flatnonzero(~varying)
+        self.rowIndices, self.colIndices = np.divmod(self.entryIndices, numCols)
+
+        self.constantValues = np.array(flatMatrices[0])
+        if(len(self.entryIndices) == numRows * numCols):
+            self.values = flatMatrices
+        else:
+            self.values = np.ascontiguousarray(flatMatrices[:, self.entryIndices])
+
+    def toDense(self):
+        dense = np.empty((self.trajecLength, self.numRows * self.numCols), dtype=self.values.dtype)
+        dense[:] = self.constantValues
+        dense[:, self.entryIndices] = self.values
+
+        return dense.reshape((self.trajecLength, self.numRows, self.numCols))
+
+class interpolatedMatrices():
+    '''
+    Lazy (P, T, rows, cols) tensor of the interpolated matrices of P parameter sets, the same values
+    generateInterpolation gives. Only the keypoints of every interpolated column and the matrix
+    columns at those keypoints are stored, indexing it like an array evaluates just the parameter
+    sets, timesteps and columns asked for, e.g. interpolation[p, :, row, col] for one entry over the
+    trajectory or interpolation[p, t] for one matrix. np.asarray builds the full tensor.
+
+    columnSpecs:    per parameter set, a list of (column, keyPoints, keyPointValues, exactStart, keyPointSlopes),
+                    keyPointSlopes is None for linear interpolation, otherwise the cubic Hermite slopes at the keypoints
+    copyLast:       the last matrix is a copy of the second to last (A matrices)
+
+    '''
+    def __init__(self, columnSpecs, trajecLength, numRows, numCols, dtype, copyLast):
+        self.columnSpecs = columnSpecs
+        self.trajecLength = trajecLength
+        self.numRows = numRows
+        self.numCols = numCols
+        self.dtype = np.dtype(dtype)
+        self.copyLast = copyLast
+
+        self.shape = (len(columnSpecs), trajecLength, numRows, numCols)
+        self.ndim = 4
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype = None, copy = None):
+        dense = self[:, :, :, :]
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        self.checkKey(key)
+        key = key + (slice(None),) * (4 - len(key))
+
+        # Parameter sets, timesteps and columns to evaluate, rows are indexed afterwards
+        params = np.arange(self.shape[0])[key[0]]
+        timesteps = np.arange(self.trajecLength)[key[1]]
+        columns = np.arange(self.numCols)[key[3]]
+
+        block = np.zeros((np.size(params), np.size(timesteps), self.numRows, np.size(columns)), dtype=self.dtype)
+        for p, param in enumerate(np.atleast_1d(params)):
+            block[p] = self.evaluate(param, np.atleast_1d(timesteps), np.atleast_1d(columns))
+
+        # Drop the parameter, time and column axes that were indexed with an integer
+        pick = tuple(0 if np.ndim(index) == 0 else slice(None) for index in (params, timesteps))
+        columnPick = 0 if np.ndim(columns) == 0 else slice(None)
+
+        return block[pick + (key[2], columnPick)]
+
+    def checkKey(self, key):
+        '''
+        Raise IndexError for keys whose result would differ from indexing the dense tensor. Supported are
+        up to four integers, slices and 1D index arrays, with at most one array that, together with any
+        integers, forms a contiguous block of the key (numpy moves non contiguous advanced indices first).
+
+        '''
+        if len(key) > 4:
+            raise IndexError("too many indices for interpolatedMatrices, it is 4 dimensional")
+
+        arrayPositions = []
+        integerPositions = []
+        for position, index in enumerate(key):
+            if index is None or index is Ellipsis:
+                raise IndexError("interpolatedMatrices does not support None or Ellipsis indices")
+            if isinstance(index, slice):
+                continue
+            if np.ndim(index) == 0:
+                integerPositions.append(position)
+            elif np.ndim(index) == 1:
+                arrayPositions.append(position)
+            else:
+                raise IndexError("interpolatedMatrices only supports 1D index arrays")
+
+        if len(arrayPositions) > 1:
+            raise IndexError("interpolatedMatrices supports at most one index array")
+        if len(arrayPositions):
+            advancedPositions = sorted(arrayPositions + integerPositions)
+            if advancedPositions[-1] - advancedPositions[0] != len(advancedPositions) - 1:
+                raise IndexError("interpolatedMatrices needs the index array and integer indices to be contiguous")
+
+    def evaluate(self, param, timesteps, columns):
+        '''
+        (len(timesteps), rows, len(columns)) interpolated matrices of one parameter set
+
+        '''
+        values = np.zeros((len(timesteps), self.numRows, len(columns)), dtype=self.dtype)
+
+        if(self.copyLast and self.trajecLength >= 2):
+            timesteps = np.where(timesteps == self.trajecLength - 1, self.trajecLength - 2, timesteps)
+
+        for column, keyPoints, keyPointValues, exactStart, keyPointSlopes in self.columnSpecs[param]:
+            outputColumns = np.flatnonzero(columns == column)
+            if(len(outputColumns) == 0 or len(keyPoints) < 2):
+                continue
+
+            segments = np.clip(np.searchsorted(keyPoints, timesteps, side="right") - 1, 0, len(keyPoints) - 2)
+            startIndices = keyPoints[segments]
+            endIndices = keyPoints[segments + 1]
+            inSegment = (timesteps >= startIndices) & (timesteps < endIndices)
+            weights = (timesteps - startIndices) / np.where(inSegment, endIndices - startIndices, 1)
+
+            startVals = keyPointValues[segments]
+            diff = keyPointValues[segments + 1] - startVals
+            if(keyPointSlopes is not None):
+                columnValues = self.evaluateHermite(startVals, keyPointValues[segments + 1], keyPointSlopes[segments], keyPointSlopes[segments + 1],
+                                                    endIndices - startIndices, weights)
+            else:
+                columnValues = startVals + (diff * weights.astype(keyPointValues.dtype)[:, None])
+            if(exactStart):
+                columnValues = np.where((weights == 0)[:, None], startVals, columnValues)
+
+            for outputColumn in outputColumns:
+                values[:, :, outputColumn] = np.where(inSegment[:, None], columnValues, values[:, :, outputColumn])
+
+        return values
+
+    def evaluateHermite(self, startVals, endVals, startSlopes, endSlopes, intervals, weights):
+        '''
+        Cubic Hermite segments through (startVals, startSlopes) and (endVals, endSlopes), evaluated in
+        float64 at the (T,) weights through each segment, slopes are per timestep
+
+        '''
+        weights = weights[:, None]
+        intervals = intervals[:, None]
+        h00 = (1 + (2 * weights)) * (1 - weights) ** 2
+        h10 = weights * (1 - weights) ** 2
+        h01 = weights ** 2 * (3 - (2 * weights))
+        h11 = weights ** 2 * (weights - 1)
+
+        values = (h00 * startVals) + (h10 * intervals * startSlopes) + (h01 * endVals) + (h11 * intervals * endSlopes)
+
+        return values.astype(self.dtype)
+
+def loadInterpolators(task, trajecNumbers, numWorkers = None, maxInFlight = None, useCache = True, returnArrays = False):
+    '''
+    Load several trajectories of a task in parallel across a pool of numWorkers processes (default
+    one per cpu). Results are yielded in the order of trajecNumbers. At most maxInFlight trajectories
+    (default 2 * numWorkers) are being loaded or waiting to be consumed at once, which caps memory.
+
+    Yields interpolator instances with every component already loaded, or if returnArrays is True
+    the dictionary of component arrays from loadTrajecComponents.
+
+    '''
+    if numWorkers is None:
+        numWorkers = os.cpu_count()
+    if maxInFlight is None:
+        maxInFlight = 2 * numWorkers
+
+    trajecNumbers = list(trajecNumbers)
+    with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+        inFlight = deque()
+        nextToSubmit = 0
+
+        while nextToSubmit < len(trajecNumbers) or len(inFlight):
+            while nextToSubmit < len(trajecNumbers) and len(inFlight) < maxInFlight:
+                inFlight.append((trajecNumbers[nextToSubmit], executor.submit(loadTrajecComponents, task, trajecNumbers[nextToSubmit], useCache)))
+                nextToSubmit += 1
+
+            trajecNumber, future = inFlight.popleft()
+            components = future.result()
+
+            if(returnArrays):
+                yield components
+            else:
+                yield interpolator(task, trajecNumber, useCache, components=components)
+
+# ------------------------------------ Keypoint method registry ------------------------------------
+# Keypoint methods are looked up by derivative_interpolator.keyPoint_method. Each method declares the
+# signals it needs, generateKeypoints computes those once per trajectory and shares them between every
+# method it runs. New methods are added with registerKeypointMethod, without editing the interpolator.
+
+KEYPOINT_SIGNALS = ("states", "controls", "A_matrices", "B_matrices", "jerkProfile", "accelProfile")
+
+@dataclass
+class keypointMethod():
+    name: str
+    function: object
+    # Names from KEYPOINT_SIGNALS the method uses, passed to function as a dict of arrays
+    signals: tuple
+
+keypointMethods = {}
+
+def registerKeypointMethod(name, signals):
+    '''
+    Decorator that registers a function as the keypoint method name, it replaces any method already
+    registered under that name
+
+    '''
+    for signal in signals:
+        if signal not in KEYPOINT_SIGNALS:
+            raise ValueError("unknown keypoint signal " + signal + ", signals are " + str(KEYPOINT_SIGNALS))
+
+    def register(function):
+        keypointMethods[name] = keypointMethod(name, function, tuple(signals))
+        return function
+
+    return register
+
+def returnKeypointMethod(name):
+    if name not in keypointMethods:
+        raise ValueError("keypoint method " + str(name) + " not found, registered methods are " + str(sorted(keypointMethods)))
+
+    return keypointMethods[name]
 
 class interpolator():
-    def __init__(self, task, trajecNumber):
+    # Attributes that are loaded from disk on first access, and the trajectory component they come from
+    LAZY_ATTRIBUTES = {"A_matrices": "A_matrices", "A_matrices_load": "A_matrices", "filteredTrajectory": "A_matrices",
+                       "B_matrices": "B_matrices", "B_matrices_load": "B_matrices",
+                       "states": "states", "controls": "controls"}
+
+    def __init__(self, task, trajecNumber, useCache = True, dataset = None, preload = False, components = None, dtype = np.float64):
 
-        startPath = "savedTrajecInfo/" + task
         self.task = task
         self.trajecNumber = trajecNumber
-
-        self.A_matrices = []
-        self.B_matrices = []
-        self.states = []
-        self.controls = []
+        self.useCache = useCache
+        self.dataset = dataset
+        # Precision the derivatives, states and interpolations are held in, np.float32 halves memory and bandwidth
+        self.dtype = np.dtype(dtype)
         
+        # Fails early if the task manifest marks this trajectory as truncated or inconsistent
+        if components is None:
+            validateTrajec(task, trajecNumber)
+
         # -------------------------------- Load meta data info -------------------------------------------
-        with open(startPath + '/meta_data.yaml', 'r') as file:
-            task_config = yaml.safe_load(file)
-
-        self.robots = task_config['robots']
-        self.bodies = []
-        try:
-            self.bodies = task_config['bodies']
-        except:
-            pass
-
-        self.dof_pos = 0
-        self.dof_vel = 0
-        self.num_ctrl = 0
-        for robot in task_config['robots']:
-            try:
-                if(task_config['robots'][robot]['base'] == True):
-                    self.dof_pos += 7
-                    self.dof_vel += 6
-                    self.quat_w_indices.append(self.dof_pos - 4)
-            except:
-                pass
+        # Parsed once per task and shared between all interpolators of that task
+        self.taskDescriptor = returnTaskDescriptor(task)
+
+        self.robots = self.taskDescriptor.robots
+        self.bodies = self.taskDescriptor.bodies
+        self.dof_pos = self.taskDescriptor.dof_pos
+        self.dof_vel = self.taskDescriptor.dof_vel
+        self.num_ctrl = self.taskDescriptor.num_ctrl
+        self.quat_w_indices = self.taskDescriptor.quat_w_indices
+        self.pos_columns = self.taskDescriptor.pos_columns
+        self.vel_columns = self.taskDescriptor.vel_columns
+        # The (position, velocity) column pair of each dof, scored by midpointErrors
+        self.dof_columns = np.stack((self.pos_columns, self.vel_columns), axis=1)
 
-            self.dof_pos += task_config['robots'][robot]['num_joints']
-            self.dof_vel += task_config['robots'][robot]['num_joints']
-            self.num_ctrl += task_config['robots'][robot]['num_actuators']
+        # -------------------------------------------------------------------------------------------------
 
-        self.quat_w_indices = []
+        # The A, B, states and controls are only loaded when first accessed (see __getattr__), so
+        # only their shapes are read here. components can hold already loaded arrays (see loadTrajecComponents).
+        if components is not None:
+            self.trajecLength = len(components["A_matrices"])
+            self.num_ctrl = components["controls"].shape[1]
+        else:
+            self.trajecLength = trajecComponentShape(task, trajecNumber, "A_matrices", useCache, dataset)[0]
+            self.num_ctrl = trajecComponentShape(task, trajecNumber, "controls", useCache, dataset)[1]
+        self.num_states = self.dof_pos + self.dof_vel
 
-        if(len(self.bodies)):
-            for body in task_config['bodies']:
-                self.dof_pos += task_config['bodies'][body]['positions']
-                self.dof_vel += (task_config['bodies'][body]['positions'])
+        # Cached differences of the states, see returnDerivedSignal
+        self.derivedSignals = {}
+        # (timestep, dof) whose A and B columns have been read, see evaluateDerivativeColumns
+        self.invalidateDerivativeColumns()
 
-                # TODO - this is quite hard coded atm and untested for multiple bodies with different orientations
-                try:
-                    if(task_config['bodies'][body]['orientation_no_w'] == 3):
-                        self.dof_vel += 3
-                        self.dof_pos += 3
-                except:
-                    if( task_config['bodies'][body]['orientations'] == 4):
-                        self.dof_vel += 3
-                        self.dof_pos += task_config['bodies'][body]['orientations']
-                        self.quat_w_indices.append(self.dof_pos - 1)
+        if components is not None:
+            for component in TRAJEC_COMPONENTS:
+                self.loadComponent(component, components[component])
+        elif(preload):
+            for component in TRAJEC_COMPONENTS:
+                self.loadComponent(component)
 
-        # print(f'dof pos: {self.dof_pos}, dof vel: {self.dof_vel}, num ctrl: {self.num_ctrl}')
-        # print(f'quat w indices: {self.quat_w_indices}')
+        self.dynParams = []
 
-        # -------------------------------------------------------------------------------------------------
-        
-        pandas = pd.read_csv(startPath + "/" + str(self.trajecNumber) + '/A_matrices.csv', header=None)
-        pandas = pandas[pandas.columns[:-1]]
-        rows, cols = pandas.shape
-        self.trajecLength = rows 
+    def __getattr__(self, name):
+        # Only called when name is not an attribute yet, i.e. a trajectory component that hasn't been loaded
+        if name in interpolator.LAZY_ATTRIBUTES:
+            self.loadComponent(interpolator.LAZY_ATTRIBUTES[name])
+            return self.__dict__[name]
+
+        # Time-varying entries of the A and B matrices, only split out when first used
+        if name == "A_sparse":
+            self.A_sparse = sparseMatrices(self.A_matrices_load, self.num_states, self.num_states)
+            return self.A_sparse
+        if name == "B_sparse":
+            self.B_sparse = sparseMatrices(self.B_matrices_load, self.num_states, self.num_ctrl)
+            return self.B_sparse
+
+        raise AttributeError("'interpolator' object has no attribute '" + name + "'")
+
+    def loadComponent(self, component, data = None):
+        if data is None:
+            data = loadTrajecComponent(self.task, self.trajecNumber, component, self.useCache, self.dataset)
+        data = data[0:self.trajecLength].astype(self.dtype, copy=False)
+
+        if(component == "A_matrices"):
+            self.A_matrices_load = data
+            # Each csv row is a row-major flattened matrix, so the (T, n, n) tensor is just a view onto the loaded data
+            reloaded = "A_matrices" in self.__dict__
+            self.A_matrices = unpackMatrices(self.A_matrices_load, self.num_states, self.num_states)
+            # The split form is rebuilt from the new matrices when next used
+            self.__dict__.pop("A_sparse", None)
+            if reloaded:
+                self.invalidateDerivativeColumns()
+
+            if(0):
+                T = 5.0         # Sample Period
+                fs = 100.0      # sample rate, Hz
+                cutoff = 1      # desired cutoff frequency of the filter, Hz ,      slightly higher than actual 1.2 Hz
+                nyq = 0.5 * fs  # Nyquist Frequency
+                order = 2       # sin wave can be approx represented as quadratic
+                n = int(T * fs) # total number of samples
+
+                self.filteredTrajectory = self.A_matrices[0].copy()
+
+                for i in range(len(self.A_matrices[0])):
+                
+                    # self.filteredTrajectory[:,i] = self.butter_lowpass_filter(self.A_matrices[0][:,i].copy(), cutoff, nyq, order)
 
-        tempPandas = pandas.iloc[0:self.trajecLength]
-        self.A_matrices_load = tempPandas.to_numpy()
+                    # self.A_matrices[0][:,i] = self.filteredTrajectory[:,i].copy()
+                    self.filteredTrajectory[:,i] = filterArray(self.A_matrices[0][:,i].copy())
+                    self.A_matrices[0][:,i] = self.filteredTrajectory[:,i].copy()
 
-        pandas = pd.read_csv(startPath + "/" + str(self.trajecNumber) + '/B_matrices.csv', header=None)
-        pandas = pandas[pandas.columns[:-1]]
-        rows, cols = pandas.shape
+            else:
+                # No filtering, so no need to hold a second copy of the A matrices
+                self.filteredTrajectory = self.A_matrices
 
-        tempPandas = pandas.iloc[0:self.trajecLength]
-        self.B_matrices_load = tempPandas.to_numpy()
+        elif(component == "B_matrices"):
+            reloaded = "B_matrices" in self.__dict__
+            self.B_matrices_load = data
+            self.B_matrices = unpackMatrices(self.B_matrices_load, self.num_states, self.num_ctrl)
+            self.__dict__.pop("B_sparse", None)
+            if reloaded:
+                self.invalidateDerivativeColumns()
 
-        pandas = pd.read_csv(startPath + "/" + str(self.trajecNumber) + '/states.csv', header=None)
-        pandas = pandas[pandas.columns[:-1]]
-        rows, cols = pandas.shape
+        elif(component == "states"):
+            self.states = data
+            self.invalidateDerivedSignals()
 
-        self.num_states = self.dof_pos + self.dof_vel
+        elif(component == "controls"):
+            self.controls = data
 
-        tempPandas = pandas.iloc[0:self.trajecLength]
-        self.states = tempPandas.to_numpy()
+    def InterpolateTrajectory(self, trajecNumber, dynParams, comparePrecision = False):
 
-        pandas = pd.read_csv(startPath + "/" + str(self.trajecNumber) +  '/controls.csv', header=None)
-        pandas = pandas[pandas.columns[:-1]]
-        rows, cols = pandas.shape
-        self.num_ctrl = cols
+        self.dynParams = dynParams
+        keyPoints_vel = self.generateKeypoints(self.A_matrices, self.B_matrices, self.states.copy(), self.controls.copy(), self.dynParams.copy())
 
-        tempPandas = pandas.iloc[0:self.trajecLength]
-        self.controls = tempPandas.to_numpy()
+        key_points_w = self.keyPoints_quaternion_w()
 
-        self.A_matrices = np.zeros((self.trajecLength, self.num_states, self.num_states))
-        self.B_matrices = np.zeros((self.trajecLength, self.num_states, self.num_ctrl))
+        # Lazy view of the interpolated A matrices of every parameter set, the dense (P, T, n, n) tensor
+        # is never built. Each parameter set's interpolation is only held while its error is calculated.
+        interpolationMethods = [dynParameters.interpolation_method for dynParameters in self.dynParams]
+        interpolatedTrajectory_A = self.returnInterpolatedMatrices("A", self.A_matrices, keyPoints_vel, key_points_w, interpolationMethods)
+        errors = np.zeros((len(self.dynParams)))
 
-        #reshape 2nd index into two indices
-        # self.A_matrices = self.A_matrices_load.reshape((self.trajecLength, self.dof_vel, self.num_states))
-        for i in range(self.trajecLength):
-            for j in range(self.num_states):
-                for k in range(self.num_states):
-                    self.A_matrices[i][j][k] = self.A_matrices_load[i][j*self.num_states + k]
+        # When running in reduced precision, optionally rerun the pipeline in float64 to report the change in error.
+        # Both runs are then scored against the float64 matrices.
+        reference = self.returnPrecisionReference(comparePrecision)
+        if reference is not None:
+            referenceKeyPoints = reference.generateKeypoints(reference.A_matrices, reference.B_matrices, reference.states.copy(), reference.controls.copy(), self.dynParams.copy())
 
-        # load the B_matrices values
-        for i in range(self.trajecLength):
-            for j in range(self.num_states):
-                for k in range(self.num_ctrl):
-                    self.B_matrices[i][j][k] = self.B_matrices_load[i][j*self.num_ctrl + k]
-            
+        for i in range(len(self.dynParams)):
+            A_interpolation, B_interpolation = self.generateInterpolation(self.A_matrices, self.B_matrices, keyPoints_vel[i].copy(), key_points_w.copy(), interpolationMethods[i])
+            if reference is None:
+                errors[i] = self.calcErrorOverTrajectory(self.A_matrices, A_interpolation)
+                # print("error from A: ", errors[i])
+                errors[i] += self.calcErrorOverTrajectory(self.B_matrices, B_interpolation)
+                # print("error from B: ", errors[i])
+            else:
+                A_reference, B_reference = reference.generateInterpolation(reference.A_matrices, reference.B_matrices, referenceKeyPoints[i].copy(), key_points_w.copy(), interpolationMethods[i])
+                errors[i], delta_A = self.calcErrorOverTrajectory(reference.A_matrices, A_interpolation, (reference.A_matrices, A_reference))
+                error_B, delta_B = self.calcErrorOverTrajectory(reference.B_matrices, B_interpolation, (reference.B_matrices, B_reference))
+                errors[i] += error_B
+                self.precisionErrorDelta[i] = delta_A + delta_B
 
-        if(0):
-            T = 5.0         # Sample Period
-            fs = 100.0      # sample rate, Hz
-            cutoff = 1      # desired cutoff frequency of the filter, Hz ,      slightly higher than actual 1.2 Hz
-            nyq = 0.5 * fs  # Nyquist Frequency
-            order = 2       # sin wave can be approx represented as quadratic
-            n = int(T * fs) # total number of samples
+        return self.filteredTrajectory, interpolatedTrajectory_A, self.A_matrices, errors, keyPoints_vel, key_points_w
 
-            self.filteredTrajectory = self.A_matrices[0].copy()
+    def InterpolateTrajectoryErrors(self, dynParams, comparePrecision = False):
+        '''
+        Same keypoints and errors as InterpolateTrajectory, for sweeps over many parameter sets that only
+        need the scores. The errors come from calcInterpolationErrors, so no interpolated matrices are
+        built. comparePrecision sets precisionErrorDelta as in InterpolateTrajectory.
 
-            for i in range(len(self.A_matrices[0])):
-                
-                # self.filteredTrajectory[:,i] = self.butter_lowpass_filter(self.A_matrices[0][:,i].copy(), cutoff, nyq, order)
+        Returns the errors and the total number of keypoints over every dof for each parameter set.
 
-                # self.A_matrices[0][:,i] = self.filteredTrajectory[:,i].copy()
-                self.filteredTrajectory[:,i] = filterArray(self.A_matrices[0][:,i].copy())
-                self.A_matrices[0][:,i] = self.filteredTrajectory[:,i].copy()
+        '''
+        self.dynParams = dynParams
+        keyPoints_vel = self.generateKeypoints(self.A_matrices, self.B_matrices, self.states.copy(), self.controls.copy(), self.dynParams.copy())
+        key_points_w = self.keyPoints_quaternion_w()
 
+        interpolationMethods = [dynParameters.interpolation_method for dynParameters in self.dynParams]
+        reference = self.returnPrecisionReference(comparePrecision)
+        if reference is None:
+            errors = self.calcInterpolationErrors("A", self.A_matrices, keyPoints_vel, key_points_w, interpolationMethods)
+            errors += self.calcInterpolationErrors("B", self.B_matrices, keyPoints_vel, key_points_w, interpolationMethods)
         else:
-            self.filteredTrajectory = self.A_matrices.copy()
+            errors = self.calcInterpolationErrors("A", self.A_matrices, keyPoints_vel, key_points_w, interpolationMethods, reference.A_matrices)
+            errors += self.calcInterpolationErrors("B", self.B_matrices, keyPoints_vel, key_points_w, interpolationMethods, reference.B_matrices)
+            referenceErrors = reference.InterpolateTrajectoryErrors(self.dynParams)[0]
+            self.precisionErrorDelta = errors - referenceErrors
+        keyPointCounts = np.array([sum(len(dofKeyPoints) for dofKeyPoints in parameterKeyPoints) for parameterKeyPoints in keyPoints_vel], dtype=int)
 
-        self.dynParams = []
+        return errors, keyPointCounts
 
-    def InterpolateTrajectory(self, trajecNumber, dynParams):
+    def returnPrecisionReference(self, comparePrecision):
+        '''
+        Float64 interpolator of the same trajectory when comparing a reduced precision run, None
+        otherwise. Resets precisionErrorDelta, which stays at zero when there is nothing to compare.
 
-        self.dynParams = dynParams
-        keyPoints_vel = self.generateKeypoints(self.A_matrices, self.B_matrices, self.states.copy(), self.controls.copy(), self.dynParams.copy())
+        '''
+        self.precisionErrorDelta = np.zeros((len(self.dynParams)))
+        if(comparePrecision and self.dtype != np.float64):
+            return interpolator(self.task, self.trajecNumber, self.useCache, self.dataset)
 
-        # If there are quaternions, generate key points for them
+        return None
+
+    def InterpolateTrajectoryWindowed(self, dynParams, windowSize):
+        '''
+        Same keypoints and error as InterpolateTrajectory, but streams the trajectory from disk in
+        windows of windowSize timesteps so peak memory is proportional to the window, not the
+        trajectory. Keypoints are generated per window, so every window boundary is a keypoint and
+        the counters of the adaptive methods restart at each window. With windowSize >= trajecLength
+        the results are identical to InterpolateTrajectory.
+
+        Returns the errors, the keypoints for every dof and the quaternion w keypoints.
+
+        '''
+        self.dynParams = dynParams
+        keyPoints_vel = [[[] for x in range(self.dof_vel)] for y in range(len(dynParams))]
         key_points_w = []
+        sum_abs_diff_A = np.zeros((len(dynParams)))
+        sum_abs_diff_B = np.zeros((len(dynParams)))
+        numTimesteps = 0
+
+        # Consecutive windows share their boundary timestep, so segments are continuous across windows
+        for startIndex, components in readTrajecChunks(self.task, self.trajecNumber, windowSize, 1, self.useCache, self.dataset):
+            windowInterpolator = interpolator(self.task, self.trajecNumber, self.useCache, components=components, dtype=self.dtype)
+            windowLength = windowInterpolator.trajecLength
+            finalWindow = (startIndex + windowLength == self.trajecLength)
+
+            windowKeyPoints = windowInterpolator.generateKeypoints(windowInterpolator.A_matrices, windowInterpolator.B_matrices,
+                                windowInterpolator.states.copy(), windowInterpolator.controls.copy(), dynParams.copy())
+            windowKeyPoints_w = windowInterpolator.keyPoints_quaternion_w()
+
+            # The shared boundary timestep is scored by the next window, apart from the final timestep
+            # which keeps the end of trajectory handling of generateLinInterpolation
+            scoredLength = windowLength if finalWindow else windowLength - 1
+            for i in range(len(dynParams)):
+                A_interpolation, B_interpolation = windowInterpolator.generateInterpolation(windowInterpolator.A_matrices,
+                                windowInterpolator.B_matrices, windowKeyPoints[i].copy(), windowKeyPoints_w.copy(), dynParams[i].interpolation_method)
+                sum_abs_diff_A[i] += np.sum(np.abs(windowInterpolator.A_matrices[0:scoredLength] - A_interpolation[0:scoredLength]))
+                sum_abs_diff_B[i] += np.sum(np.abs(windowInterpolator.B_matrices[0:scoredLength] - B_interpolation[0:scoredLength]))
+
+                for j in range(self.dof_vel):
+                    for keyPoint in windowKeyPoints[i][j]:
+                        if not len(keyPoints_vel[i][j]) or keyPoints_vel[i][j][-1] != startIndex + keyPoint:
+                            keyPoints_vel[i][j].append(startIndex + keyPoint)
+
+            for keyPoint in windowKeyPoints_w:
+                if not len(key_points_w) or key_points_w[-1] != startIndex + keyPoint:
+                    key_points_w.append(startIndex + keyPoint)
+
+            numTimesteps += scoredLength
+
+        errors = (sum_abs_diff_A / (numTimesteps * self.num_states * self.num_states)) + (sum_abs_diff_B / (numTimesteps * self.num_states * self.num_ctrl))
         if(len(self.quat_w_indices)):
-            key_points_w = np.arange(0, self.trajecLength, 5)
+            key_points_w = np.array(key_points_w)
 
-            if(key_points_w[-1] != self.trajecLength - 1):
-                key_points_w = np.append(key_points_w, self.trajecLength - 1)
+        return errors, keyPoints_vel, key_points_w
+
+    def InterpolateTrajectorySparse(self, dynParams):
+        '''
+        Same keypoints and error as InterpolateTrajectory, but the interpolation and error are computed
+        on the sparseMatrices split of the A and B matrices, so only the entries that change over
+        the trajectory are interpolated.
+
+        Returns the errors, the keypoints for every dof, the quaternion w keypoints and, for every
+        parameter set, the (T, nnz) interpolated values of A_sparse and B_sparse. Only linear
+        interpolation is supported.
+
+        '''
+        for dynParameters in dynParams:
+            if(dynParameters.interpolation_method != "linear"):
+                raise ValueError("InterpolateTrajectorySparse only supports linear interpolation, not " + str(dynParameters.interpolation_method))
+
+        self.dynParams = dynParams
+        keyPoints_vel = self.generateKeypoints(self.A_matrices, self.B_matrices, self.states.copy(), self.controls.copy(), self.dynParams.copy())
+        key_points_w = self.keyPoints_quaternion_w()
 
         A_all_interpolations = []
         B_all_interpolations = []
+        errors = np.zeros((len(self.dynParams)))
         for i in range(len(self.dynParams)):
-            A_interpolation, B_interpolation = self.generateLinInterpolation(self.A_matrices, self.B_matrices, keyPoints_vel[i].copy(), key_points_w.copy())
+            A_interpolation = self.generateSparseLinInterpolation(self.A_sparse, "A", keyPoints_vel[i], key_points_w)
+            B_interpolation = self.generateSparseLinInterpolation(self.B_sparse, "B", keyPoints_vel[i], key_points_w)
             A_all_interpolations.append(A_interpolation)
             B_all_interpolations.append(B_interpolation)
 
-        interpolatedTrajectory_A = np.zeros((len(self.dynParams), self.trajecLength, self.num_states, self.num_states))
-        interpolatedTrajectory_B = np.zeros((len(self.dynParams), self.trajecLength, self.num_states, self.num_ctrl))
-        errors = np.zeros((len(self.dynParams)))
+            errors[i] = self.calcErrorOverTrajectorySparse(self.A_sparse, "A", A_interpolation, keyPoints_vel[i], key_points_w)
+            errors[i] += self.calcErrorOverTrajectorySparse(self.B_sparse, "B", B_interpolation, keyPoints_vel[i], key_points_w)
 
-        for i in range(len(self.dynParams)):
-            interpolatedTrajectory_A[i,:,:,:] = A_all_interpolations[i].copy()
-            errors[i] = self.calcErrorOverTrajectory(self.A_matrices, A_all_interpolations[i])
-            # print("error from A: ", errors[i])
-            errors[i] += self.calcErrorOverTrajectory(self.B_matrices, B_all_interpolations[i])
-            # print("error from B: ", errors[i])
+        return errors, keyPoints_vel, key_points_w, A_all_interpolations, B_all_interpolations
 
-        return self.filteredTrajectory, interpolatedTrajectory_A, self.A_matrices, errors, keyPoints_vel, key_points_w
+    def keyPoints_quaternion_w(self):
+        # If there are quaternions, generate key points for them
+        key_points_w = []
+        if(len(self.quat_w_indices)):
+            key_points_w = np.arange(0, self.trajecLength, 5)
+
+            if(key_points_w[-1] != self.trajecLength - 1):
+                key_points_w = np.append(key_points_w, self.trajecLength - 1)
+
+        return key_points_w
     
-    def calcErrorOverTrajectory(self, groundTruth, prediction):
+    def calcErrorOverTrajectory(self, groundTruth, prediction, reference = None):
         '''
         Calculate a single number for the error over a trajectory between the true
         trajectory and our interpolation
 
+        The error is always accumulated in float64. If a float64 (groundTruth, prediction)
+        reference is given, the change in error of this (reduced precision) run relative to
+        the float64 one is returned as well.
+
         '''
         sum_abs_diff = np.zeros((groundTruth.shape[1], groundTruth.shape[2]))
         for t in range(self.trajecLength):
@@ -199,88 +613,212 @@ class interpolator():
         # Aevrage over the size of the matrix
         MAE = np.sum(sum_abs_diff) / (groundTruth.shape[1] * groundTruth.shape[2])
 
+        if reference is not None:
+            return MAE, MAE - self.calcErrorOverTrajectory(reference[0], reference[1])
+
         return MAE 
     
+    def calcInterpolationErrors(self, matrixType, matrices, keyPoints, key_points_w, interpolationMethods = None, groundTruth = None):
+        '''
+        calcErrorOverTrajectory of the interpolation of every parameter set in keyPoints, without
+        building the interpolations. Each interpolated column is evaluated from its keypoints on its own
+        and scored against the true column. Columns that are never interpolated stay at zero in
+        generateLinInterpolation, so their error is the same for every parameter set and summed once.
+
+        The interpolation is built from matrices and scored against groundTruth, which defaults to
+        matrices. A reduced precision interpolation is scored against the float64 matrices this way.
+
+        The result matches calcErrorOverTrajectory up to the order the absolute errors are summed in.
+
+        '''
+        if groundTruth is None:
+            groundTruth = matrices
+
+        interpolation = self.returnInterpolatedMatrices(matrixType, matrices, keyPoints, key_points_w, interpolationMethods)
+        timesteps = np.arange(self.trajecLength)
+        columnAbsSums = np.sum(np.abs(groundTruth), axis=(0, 1), dtype=np.float64)
+
+        errors = np.zeros((len(keyPoints)))
+        for p in range(len(keyPoints)):
+            interpolatedColumns = np.unique([spec[0] for spec in interpolation.columnSpecs[p]]).astype(int)
+            sum_abs_diff = np.sum(np.delete(columnAbsSums, interpolatedColumns))
+
+            for column in interpolatedColumns:
+                prediction = interpolation.evaluate(p, timesteps, np.array([column]))[:, :, 0]
+                sum_abs_diff += np.sum(np.abs(groundTruth[:, :, column] - prediction), dtype=np.float64)
+
+            errors[p] = sum_abs_diff / (self.trajecLength * matrices.shape[1] * matrices.shape[2])
+
+        return errors
+
     def returnTrajecInformation(self):
         self.jerkProfile = self.calcJerkOverTrajectory(self.states)
         self.accelProfile = self.calculateAccellerationOverTrajectory(self.states)
 
         return self.jerkProfile, self.accelProfile, self.states.copy(), self.controls.copy()
 
-    def calculateAccellerationOverTrajectory(self, trajectoryStates):
-        # state vector = self.dof_pos + self.dof_vel
-        acell = np.zeros((self.trajecLength - 1, self.dof_vel))
+    # ----------------------------------- Derived signals -------------------------------------------
+    # Differences of the states (velocity deltas, acceleration and jerk) are computed once per loaded
+    # trajectory and cached. The cache is cleared when new states are loaded, if self.states is
+    # modified in place invalidateDerivedSignals() has to be called.
 
+    def invalidateDerivedSignals(self):
+        self.derivedSignals = {}
 
-        for i in range(self.trajecLength - 1):
+    def returnDerivedSignal(self, name):
+        '''
+        Return a cached derived signal of self.states, computing it on first use. Cached arrays are
+        read only as they are shared between every caller.
 
-            vel1 = trajectoryStates[i,self.dof_pos:].copy()
-            vel2 = trajectoryStates[i+1,self.dof_pos:].copy()
+        '''
+        if name not in self.derivedSignals:
+            self.derivedSignals[name] = self.calcDerivedSignal(name, self.states)
+            self.derivedSignals[name].flags.writeable = False
 
-            currentAccel = vel2 - vel1
+        return self.derivedSignals[name]
 
-            acell[i,:] = currentAccel
+    # ------------------------------- Evaluated derivative columns --------------------------------------
+    # Keypoint configurations of a sweep mostly share timesteps. Evaluating the derivatives of a dof
+    # at a timestep gives its position and velocity columns of A and its column of B, so the (timestep,
+    # dof) pairs read by any parameter set are recorded. The number of distinct pairs is what a
+    # derivative oracle would have to compute for the sweep. Only a (T, dof) mask is kept, the values
+    # are read from the A and B matrices. The mask is cleared when the A or B matrices are reloaded.
 
-        return acell
+    def invalidateDerivativeColumns(self):
+        self.derivativeColumnsEvaluated = np.zeros((self.trajecLength, self.dof_vel), dtype=bool)
 
-    def calcJerkOverTrajectory(self, trajectoryStates):
-        jerk = np.zeros((self.trajecLength - 2, self.dof_vel))
+    def evaluateDerivativeColumns(self, dof, timesteps):
+        '''
+        Record the A and B columns of dof as evaluated at the timesteps
+
+        '''
+        self.derivativeColumnsEvaluated[np.asarray(timesteps, dtype=int), dof] = True
+
+    def returnDerivativeColumn(self, matrixType, column, dof, timesteps):
+        '''
+        (K, rows) values of a column of dof at the timesteps, recording them as evaluated
+
+        '''
+        # An evaluation gives both the A and B columns, so both are loaded before it is recorded
+        A_matrices, B_matrices = self.A_matrices, self.B_matrices
+        self.evaluateDerivativeColumns(dof, timesteps)
 
-        for i in range(self.trajecLength - 2):
+        return (A_matrices if matrixType == "A" else B_matrices)[timesteps, :, column]
 
-            state1 = trajectoryStates[i,self.dof_pos:].copy()
-            state2 = trajectoryStates[i+1,self.dof_pos:].copy()
-            state3 = trajectoryStates[i+2,self.dof_pos:].copy()
+    def returnNumDerivativeEvaluations(self):
+        '''
+        Number of distinct (timestep, dof) derivative evaluations since the cache was last cleared
+
+        '''
+        return int(np.count_nonzero(self.derivativeColumnsEvaluated))
+
+    def calcDerivedSignal(self, name, trajectoryStates):
+        trajectoryStates = trajectoryStates[0:self.trajecLength]
+
+        if(name == "stateDeltas"):
+            # stateDeltas[i] = states[i + 1] - states[i], for every state column
+            return np.diff(trajectoryStates, axis=0)
 
-            accel1 = state3 - state2
-            accel2 = state1 - state1
+        elif(name == "accelProfile"):
+            accel = np.zeros((self.trajecLength - 1, self.dof_vel))
+            accel[:] = np.diff(trajectoryStates[:, self.dof_pos:], axis=0)
+            return accel
 
-            currentJerk = accel2 - accel1
+        elif(name == "jerkProfile"):
+            # The jerk has always been computed as (state1 - state1) - (state3 - state2), i.e. the
+            # negated change in velocity between the next two timesteps. That is kept as is so
+            # existing jerk thresholds still give the same keypoints.
+            velocities = trajectoryStates[:, self.dof_pos:]
+            jerk = np.zeros((self.trajecLength - 2, self.dof_vel))
+            jerk[:] = (velocities[:-2] - velocities[:-2]) - np.diff(velocities[1:], axis=0)
+            return jerk
 
-            jerk[i,:] = currentJerk
+        raise ValueError("unknown derived signal " + name)
 
-        return jerk
+    def calculateAccellerationOverTrajectory(self, trajectoryStates):
+        # state vector = self.dof_pos + self.dof_vel
+        if trajectoryStates is self.__dict__.get("states"):
+            return self.returnDerivedSignal("accelProfile")
+
+        return self.calcDerivedSignal("accelProfile", trajectoryStates)
+
+    def calcJerkOverTrajectory(self, trajectoryStates):
+        if trajectoryStates is self.__dict__.get("states"):
+            return self.returnDerivedSignal("jerkProfile")
+
+        return self.calcDerivedSignal("jerkProfile", trajectoryStates)
     
-    def generateKeypoints(self, A_matrices, B_matrices, trajectoryStates, trajectoryControls, dynParameters):
+    def generateKeypoints(self, A_matrices, B_matrices, trajectoryStates, trajectoryControls, dynParameters, numWorkers = None):
+        '''
+        Generate keypoints for every parameter set in dynParameters. Parameter sets are grouped by
+        keypoint method, the signals all the methods need are computed once and shared by every
+        group. With numWorkers > 1 the groups run in parallel threads.
+
+        '''
         keyPoints = [None] * len(dynParameters)
 
+        methodGroups = {}
         for i in range(len(dynParameters)):
+            methodGroups.setdefault(dynParameters[i].keyPoint_method, []).append(i)
+
+        methods = [returnKeypointMethod(keyPoint_method) for keyPoint_method in methodGroups]
+        signalNames = set(signal for method in methods for signal in method.signals)
+        signals = self.returnKeypointSignals(signalNames, A_matrices, B_matrices, trajectoryStates, trajectoryControls)
 
-            if(dynParameters[i].keyPoint_method =="setInterval"):
-                keyPoints[i] = self.keyPoints_setInterval(dynParameters[i])
-            elif(dynParameters[i].keyPoint_method =="adaptiveJerk"):
-                keyPoints[i] = self.keyPoints_adaptiveJerk(trajectoryStates, dynParameters[i])
-            elif(dynParameters[i].keyPoint_method =="adaptiveAccel"):
-                keyPoints[i] = self.keyPoints_adaptiveAccel(trajectoryStates, dynParameters[i])
-            elif(dynParameters[i].keyPoint_method =="iterativeError"):
-                keyPoints[i] = self.keyPoints_iteratively(A_matrices, dynParameters[i])
-            elif(dynParameters[i].keyPoint_method =="magVelChange"):
-                keyPoints[i] = self.keyPoints_magVelChange(trajectoryStates, trajectoryControls, dynParameters[i])
-            else: 
-                print("keypoint method not found")
+        groupParams = [[dynParameters[i] for i in indices] for indices in methodGroups.values()]
+
+        if numWorkers is not None and numWorkers > 1 and len(methods) > 1:
+            with ThreadPoolExecutor(max_workers=numWorkers) as executor:
+                groupKeyPoints = list(executor.map(self.runKeypointMethod, methods, [signals] * len(methods), groupParams))
+        else:
+            groupKeyPoints = [self.runKeypointMethod(method, signals, dynParams) for method, dynParams in zip(methods, groupParams)]
+
+        for indices, methodKeyPoints in zip(methodGroups.values(), groupKeyPoints):
+            for i, groupIndex in zip(indices, range(len(indices))):
+                keyPoints[i] = methodKeyPoints[groupIndex]
 
         return keyPoints
-    
+
+    def returnKeypointSignals(self, signalNames, A_matrices, B_matrices, trajectoryStates, trajectoryControls):
+        signals = {}
+
+        for name in signalNames:
+            if(name == "states"):
+                signals[name] = trajectoryStates
+            elif(name == "controls"):
+                signals[name] = trajectoryControls
+            elif(name == "A_matrices"):
+                signals[name] = A_matrices
+            elif(name == "B_matrices"):
+                signals[name] = B_matrices
+            # The jerk and accel profiles have always been taken from self.states
+            elif(name == "jerkProfile"):
+                signals[name] = self.calcJerkOverTrajectory(self.states)
+            elif(name == "accelProfile"):
+                signals[name] = self.calculateAccellerationOverTrajectory(self.states)
+
+        return signals
+
+    def runKeypointMethod(self, method, signals, dynParams):
+        return [method.function(self, signals, dynParameters) for dynParameters in dynParams]
+
     def keyPoints_setInterval(self, dynParameters):
-        keyPoints = [[] for x in range(self.dof_vel)]
+        # Every dof uses the same keypoints, so build the grid once and copy it for each dof
+        keyPointGrid = self.keyPoints_setIntervalGrid(dynParameters).tolist()
 
-        for i in range(self.dof_vel):
-            keyPoints[i].append(0)
+        return [keyPointGrid.copy() for x in range(self.dof_vel)]
 
-        minN = dynParameters.minN
-    
-        for i in range(self.dof_vel):
-            counter = 0
-            for j in range(self.trajecLength - 1):
-                counter += 1
-                if counter >= minN:
-                    counter = 0
-                    keyPoints[i].append(j)
+    def keyPoints_setIntervalGrid(self, dynParameters):
+        '''
+        Compact form of keyPoints_setInterval, a single array of keypoints shared by all dofs:
+        0, every minN'th timestep and the final timestep
 
-        for i in range(self.dof_vel):
-            keyPoints[i].append(self.trajecLength - 1)
+        '''
+        minN = max(dynParameters.minN, 1)
 
-        return keyPoints 
+        keyPointGrid = np.concatenate(([0], np.arange(minN - 1, self.trajecLength - 1, minN), [self.trajecLength - 1]))
+
+        return keyPointGrid.astype(int)
     
     def keyPoints_adaptive_velocity(self, trajectoryStates, dynParameters):
         mainKeyPoints = [[] for x in range(self.dof_vel)]
@@ -291,7 +829,7 @@ class interpolator():
         for i in range(self.dof_pos):
             mainKeyPoints[i].append(0)
 
-        velProfile = self.states[0][:, self.dof_vel:2*self.dof_vel]
+        velProfile = self.states[0][:, self.vel_columns]
 
         direction_temp = []
 
@@ -332,47 +870,88 @@ class interpolator():
         return keyPoints 
 
     def keyPoints_magVelChange(self, trajectoryStates, trajectoryControls, dynParameters):
-        minN = dynParameters.minN
-        maxN = dynParameters.maxN
-        # velChangeRequired = 2.0
+        '''
+        Walking forward in time, a keypoint is placed when the velocity has changed by more than
+        vel_change_required since the last keypoint, when maxN steps have passed since the counter was
+        last reset, or when the velocity changes direction at least minN steps after the counter was
+        last reset. Velocity change keypoints don't reset the counter.
+
+        Everything that doesn't depend on where the last keypoint was is computed up front for all
+        dofs and timesteps with array operations: for every possible last keypoint, the first timestep
+        whose velocity differs from it by more than vel_change_required (only maxN steps ahead are
+        needed, the counter forces a keypoint by then), and for every timestep the next change of
+        direction. Each dof's keypoints are then read off by jumping from keypoint to keypoint.
+
+        '''
+        minN, maxN = minSteps(dynParameters)
         velChangeRequired = dynParameters.vel_change_required
 
-        keyPoints = [[] for x in range(self.dof_vel)]
-        # currentVelChange = np.zeros((self.dof_pos))
-        lastVelCounter = np.zeros((self.dof_vel))
-        lastVelDirection = np.zeros((self.dof_vel))
+        # The velocity change is computed against a float64 copy of the last keypoint's velocity, so it
+        # is float64 for any dtype
+        velocities = trajectoryStates[0:self.trajecLength, self.vel_columns].astype(np.float64)
+
+        # firstVelChange[a, i] - first timestep after a whose velocity differs from dof i's velocity at
+        # a by more than velChangeRequired, trajecLength if there isn't one in the next maxN steps
+        lookAhead = min(max(maxN, 1), self.trajecLength - 1)
+        firstVelChange = np.full((self.trajecLength, self.dof_vel), self.trajecLength)
+        unresolved = np.ones((self.trajecLength, self.dof_vel), dtype=bool)
+        for steps in range(1, lookAhead + 1):
+            currentVelChange = velocities[steps:] - velocities[:-steps]
+            velChanged = ((currentVelChange > velChangeRequired) | (currentVelChange < -velChangeRequired)) & unresolved[:-steps]
+            firstVelChange[:-steps][velChanged] = np.nonzero(velChanged)[0] + steps
+            unresolved[:-steps] &= ~velChanged
+            if(not unresolved[:-steps - 1].any()):
+                break
+
+        # directionChange[j, i] - the velocity of dof i changes direction at timestep j. The sign of a
+        # difference doesn't depend on the precision it is computed in
+        velDirections = np.sign(np.diff(velocities, axis=0))
+        directionChange = np.zeros((self.trajecLength, self.dof_vel), dtype=bool)
+        directionChange[2:] = (velDirections[1:] * velDirections[:-1]) < 0
+
+        # nextDirectionChange[j, i] - first timestep >= j where dof i changes direction, an extra row
+        # of trajecLength at the end so lookups past the end of the trajectory are valid
+        directionChangeIndices = np.where(directionChange, np.arange(self.trajecLength)[:, None], self.trajecLength)
+        nextDirectionChange = np.full((self.trajecLength + 1, self.dof_vel), self.trajecLength)
+        nextDirectionChange[:self.trajecLength] = np.minimum.accumulate(directionChangeIndices[::-1], axis=0)[::-1]
 
-        counter = np.zeros((self.dof_vel))
+        keyPoints = [[] for x in range(self.dof_vel)]
 
         for i in range(self.dof_vel):
             keyPoints[i].append(0)
-            lastVelCounter[i] = trajectoryStates[0, i + self.dof_vel]
-
-        for i in range(self.dof_vel):
-            for j in range(1, self.trajecLength):
-                counter[i] += 1
-
-                # velChange = trajectoryStates[j+1, i + self.dof_vel] - trajectoryStates[j, i + self.dof_vel]
-                # currentVelChange[i] += velChange
-                currentVelDirection = trajectoryStates[j, i + self.dof_vel] - trajectoryStates[j-1, i + self.dof_vel]
-                currentVelChange = trajectoryStates[j, i + self.dof_vel] - lastVelCounter[i]
-
-                if(currentVelChange > velChangeRequired or currentVelChange < -velChangeRequired):
-                    keyPoints[i].append(j)
-                    lastVelCounter[i] = trajectoryStates[j, i + self.dof_vel]
-                else:
-                    if(counter[i] >= maxN):
-                        keyPoints[i].append(j)
-                        counter[i] = 0
-                        lastVelCounter[i] = trajectoryStates[j, i + self.dof_vel]
-                    else:
-                        if(currentVelDirection * lastVelDirection[i] < 0):
-                            if(counter[i] >= minN):
-                                keyPoints[i].append(j)
-                                lastVelCounter[i] = trajectoryStates[j, i + self.dof_vel]
-                                counter[i] = 0
-
-                lastVelDirection[i] = currentVelDirection
+            firstVelChangeList = firstVelChange[:, i].tolist()
+            nextDirectionChangeList = nextDirectionChange[:, i].tolist()
+
+            # lastKeyPoint - velocity anchor, counterReset - timestep the counter was last zero
+            lastKeyPoint = 0
+            counterReset = 0
+
+            # Plain comparisons rather than min / max, this loop runs once per keypoint
+            while(True):
+                velChangeStep = firstVelChangeList[lastKeyPoint]
+
+                maxStep = counterReset + maxN
+                if(maxStep <= lastKeyPoint):
+                    maxStep = lastKeyPoint + 1
+
+                directionChangeStep = counterReset + minN
+                if(directionChangeStep <= lastKeyPoint):
+                    directionChangeStep = lastKeyPoint + 1
+                if(directionChangeStep < self.trajecLength):
+                    directionChangeStep = nextDirectionChangeList[directionChangeStep]
+
+                keyPoint = velChangeStep
+                if(maxStep < keyPoint):
+                    keyPoint = maxStep
+                if(directionChangeStep < keyPoint):
+                    keyPoint = directionChangeStep
+                if(keyPoint >= self.trajecLength):
+                    break
+
+                keyPoints[i].append(keyPoint)
+                if(keyPoint != velChangeStep):
+                    counterReset = keyPoint
+                lastKeyPoint = keyPoint
 
         for i in range(self.dof_vel):
             if(keyPoints[i][-1] != self.trajecLength - 1):
@@ -381,180 +960,339 @@ class interpolator():
         return keyPoints
 
     def keyPoints_adaptiveJerk(self, trajectoryStates, dynParameters):
-        mainKeyPoints = [[] for x in range(self.dof_vel)]
-        keyPoints = [[] for x in range(self.dof_vel)]
+        return self.keyPoints_adaptiveThreshold(self.calcJerkOverTrajectory(self.states), 1, dynParameters, dynParameters.jerkThreshold)
 
-        for i in range(self.dof_vel):
-            mainKeyPoints[i].append(0)
-
-        counterSinceLastEval = np.zeros((self.dof_vel))
-        outsideHysterisis = [False] * self.dof_vel
-        resetToZeroAddKeypoint = [False] * self.dof_vel
+    def keyPoints_adaptiveAccel(self, trajectoryStates, dynParameters):
+        return self.keyPoints_adaptiveThreshold(self.calculateAccellerationOverTrajectory(self.states), 0, dynParameters, dynParameters.acellThreshold)
 
-        minN = dynParameters.minN
-        maxN = dynParameters.maxN
-        jerkThreshold = dynParameters.jerkThreshold
-        # temp
-        # velGradCubeSensitivity = 0.0002
+    def keyPoints_adaptiveThreshold(self, profile, startIndex, dynParameters, threshold):
+        '''
+        Shared state machine for the adaptive jerk and acceleration methods. Walking the profile from
+        startIndex, a keypoint is placed when the profile leaves [-threshold, threshold] at least minN
+        steps after the last keypoint, or maxN steps after the last keypoint regardless. minN and maxN
+        are those of dynParameters, the threshold is passed separately as it depends on the profile.
 
-        jerkProfile = self.calcJerkOverTrajectory(self.states)
+        The next keypoint only depends on where the last one was, so the successor of every timestep
+        is computed for all dofs at once with array operations, each dof's keypoints are then read
+        off by following its chain of successors from startIndex.
 
-        for i in range(self.dof_vel):
-            for j in range(1, len(jerkProfile)):
-
-                # if(outsideHysterisis[i] == True):
-                #     if(jerkProfile[j, i] < jerkSensitivity and jerkProfile[j, i] > -jerkSensitivity):
-                #         mainKeyPoints[i].append(j)
-                #         outsideHysterisis[i] = False
-                #         resetToZeroAddKeypoint[i] = True
-                #         counterSinceLastEval[i] = 0
-                #     else:
-                #         pass
-                #         # counterSinceLastEval[i] += 1
-                #         # if(counterSinceLastEval[i] >= minN):
-                #         #     mainKeyPoints[i].append(j)
-                #         #     counterSinceLastEval[i] = 0
-
-                # else:
-                #     if(jerkProfile[j, i] > jerkSensitivity or jerkProfile[j, i] < -jerkSensitivity):
-                #         # keyPoints[i].append(j-5)
-                #         if(mainKeyPoints[i][-1] != j-1):
-                #             mainKeyPoints[i].append(j-1)
-                #         mainKeyPoints[i].append(j)
-                #         outsideHysterisis[i] = True
-                #         resetToZeroAddKeypoint[i] = False
-                #         counterSinceLastEval[i] = 0
-
-                #     if(resetToZeroAddKeypoint[i] == True):
-                #         # print("reset to zero add keypoint")
-                #         if(jerkProfile[j, i] < 0.000001 and jerkProfile[j, i] > -0.000001):
-                #             mainKeyPoints[i].append(j)
-                #             resetToZeroAddKeypoint[i] = False
-                #             counterSinceLastEval[i] = 0
-
-                #     if(counterSinceLastEval[i] >= maxN):
-                #         mainKeyPoints[i].append(j)
-                #         counterSinceLastEval[i] = 0
-
-                #     counterSinceLastEval[i] = counterSinceLastEval[i] + 1
-
-                if(counterSinceLastEval[i] >= minN):
-                    # print("jerk profile: " + str(jerkProfile[j, i]))
-                    if(jerkProfile[j, i] > jerkThreshold or jerkProfile[j, i] < -jerkThreshold):
-                        mainKeyPoints[i].append(j)
-                        counterSinceLastEval[i] = 0
-                
-                if(counterSinceLastEval[i] >= maxN):
-                    mainKeyPoints[i].append(j)
-                    counterSinceLastEval[i] = 0
+        '''
+        profile = profile[:, :self.dof_vel]
+        profileLength = len(profile)
+        minN, maxN = minSteps(dynParameters)
+
+        # nextCrossing[j, i] - first timestep >= j where dof i is outside the threshold, an extra
+        # row of profileLength at the end so lookups past the end of the profile are valid
+        crossings = (profile > threshold) | (profile < -threshold)
+        crossingIndices = np.where(crossings, np.arange(profileLength)[:, None], profileLength)
+        nextCrossing = np.full((profileLength + 1, self.dof_vel), profileLength)
+        if(profileLength > 0):
+            nextCrossing[:profileLength] = np.minimum.accumulate(crossingIndices[::-1], axis=0)[::-1]
+
+        # Row 0 is the initial state, the counter is zero at startIndex. Row k + 1 is the state after
+        # a keypoint at timestep k, the counter is one at timestep k + 1
+        lastKeyPoint = np.concatenate(([startIndex], np.arange(profileLength)))
+        firstStep = np.concatenate(([startIndex], np.arange(1, profileLength + 1)))
+
+        crossingStep = nextCrossing[np.minimum(np.maximum(firstStep, lastKeyPoint + minN), profileLength)]
+        maxStep = np.maximum(firstStep, lastKeyPoint + maxN)[:, None]
+        successor = np.minimum(crossingStep, maxStep)
+
+        # A threshold crossing resets the counter before the maxN check, which then fires again on
+        # the same timestep when maxN <= 0
+        repeated = (crossingStep <= maxStep) & (maxN <= 0)
 
-                counterSinceLastEval[i] = counterSinceLastEval[i] + 1
+        keyPoints = [[] for x in range(self.dof_vel)]
 
         for i in range(self.dof_vel):
-            for j in range(len(mainKeyPoints[i])):
-                if(j == 0):
-                    keyPoints[i].append(mainKeyPoints[i][j])
-                else:
-                    # keyPoints[i].append(mainKeyPoints[i][j] - 15)
-                    # keyPoints[i].append(mainKeyPoints[i][j] - 10)
-                    # keyPoints[i].append(mainKeyPoints[i][j] - 5)
-                    keyPoints[i].append(mainKeyPoints[i][j])
-                    # keyPoints[i].append(mainKeyPoints[i][j] + 5)
-                    # keyPoints[i].append(mainKeyPoints[i][j] + 10)
-                    # keyPoints[i].append(mainKeyPoints[i][j] + 15)
+            keyPoints[i].append(0)
+            successorList = successor[:, i].tolist()
+            repeatedList = repeated[:, i].tolist()
+
+            state = 0
+            keyPoint = successorList[state]
+            while(keyPoint < profileLength):
+                keyPoints[i].append(keyPoint)
+                if(repeatedList[state]):
+                    keyPoints[i].append(keyPoint)
+                state = keyPoint + 1
+                keyPoint = successorList[state]
 
-        for i in range(self.dof_vel):
             keyPoints[i].append(self.trajecLength - 1)
-        
-        return keyPoints 
 
-    def keyPoints_adaptiveAccel(self, trajectoryStates, dynParameters):
-        keyPoints = [[] for x in range(self.dof_vel)]
+        return keyPoints
+
+    def keyPoints_iteratively(self, trajectoryStates, dynParameters):
+        '''
+        Breadth first bisection of every dof at once, starting from the whole trajectory (see
+        bisectSegments).
 
+        '''
+        acceptedDofs, acceptedIndices = self.bisectSegments(trajectoryStates, np.zeros(self.dof_vel, dtype=int), np.full(self.dof_vel, self.trajecLength - 1),
+                                                            np.arange(self.dof_vel), dynParameters.minN, dynParameters.iterative_error_threshold)
+
+        keyPoints = [[] for x in range(self.dof_vel)]
         for i in range(self.dof_vel):
-            keyPoints[i].append(0)
+            keyPoints[i] = np.unique(np.concatenate(([0], acceptedIndices[acceptedDofs == i]))).tolist()
 
-        counterSinceLastEval = np.zeros((self.dof_vel))
+        return keyPoints
 
-        minN = dynParameters.minN
-        maxN = dynParameters.maxN
-        acellThreshold = dynParameters.acellThreshold
+    def bisectSegments(self, A_matrices, startIndices, endIndices, dofNums, minN, iter_error_thresh):
+        '''
+        Breadth first bisection of a set of segments, each for its own dof. The segments still being
+        refined are held as flat arrays of start index, end index and dof, and each refinement level
+        checks the midpoint error of all of them together. Segments with a small enough error (or no
+        longer than minN) keep their start, midpoint and end as keypoints, the rest are split in two at
+        the midpoint.
 
-        accelProfile = self.calculateAccellerationOverTrajectory(self.states)
+        Returns flat arrays of the dof and timestep of every keypoint, they may contain repeats.
 
-        for i in range(self.dof_vel):
-            for j in range(len(accelProfile)):
+        '''
+        acceptedDofs = [np.zeros(0, dtype=int)]
+        acceptedIndices = [np.zeros(0, dtype=int)]
 
-                if(counterSinceLastEval[i] >= minN):
-                    if(accelProfile[j, i] > acellThreshold or accelProfile[j, i] < -acellThreshold):
-                        keyPoints[i].append(j)
-                        counterSinceLastEval[i] = 0
-                
-                if(counterSinceLastEval[i] >= maxN):
-                    keyPoints[i].append(j)
-                    counterSinceLastEval[i] = 0
+        while(len(startIndices) > 0):
+            midIndices = (startIndices + endIndices) // 2
 
-                counterSinceLastEval[i] = counterSinceLastEval[i] + 1
+            approximationGood = (endIndices - startIndices) <= minN
+            toCheck = ~approximationGood
+            if(toCheck.any()):
+                midErrors = self.midpointErrors(A_matrices, startIndices[toCheck], endIndices[toCheck], dofNums[toCheck])
+                approximationGood[toCheck] = midErrors < iter_error_thresh
 
-        for i in range(self.dof_vel):
-            keyPoints[i].append(self.trajecLength - 1)
-        
-        return keyPoints 
+            acceptedDofs.append(np.tile(dofNums[approximationGood], 3))
+            acceptedIndices.append(np.concatenate((startIndices[approximationGood], midIndices[approximationGood], endIndices[approximationGood])))
 
-    def keyPoints_iteratively(self, trajectoryStates, dynParameters):
-        keyPoints = [[] for x in range(self.dof_vel)]
-        for i in range(self.dof_vel):
-            keyPoints[i].append(0)
+            split = ~approximationGood
+            startIndices, endIndices = np.concatenate((startIndices[split], midIndices[split])), np.concatenate((midIndices[split], endIndices[split]))
+            dofNums = np.concatenate((dofNums[split], dofNums[split]))
+
+        return np.concatenate(acceptedDofs), np.concatenate(acceptedIndices)
 
+    def keyPoints_warmStart(self, A_matrices, previousKeyPoints, shift, dynParameters):
+        '''
+        iterativeError keypoints for a receding horizon, warm started from the previous horizon's
+        keypoints. The previous horizon, of the same length, started shift timesteps earlier and
+        A_matrices is the new horizon.
+
+        The previous keypoints that are still inside the horizon are kept, apart from the previous
+        horizon's end which was only a boundary. Every segment between kept keypoints is revalidated
+        against the new A matrices along with the new head (up to the first kept keypoint) and tail
+        (after the last kept keypoint), and those over the threshold are split and bisected. Kept
+        keypoints between two valid segments are pruned when the interpolation between their
+        neighbours is good at them and the merged segment is valid as well, so the keypoints don't
+        accumulate over the horizons.
+
+        Every check of the kept keypoints is known up front, so they are scored in one midpointErrors
+        call and only the failed segments are bisected. A valid kept segment adds no keypoints, a valid
+        head or tail adds its midpoint like an accepted segment of bisectSegments.
+
+        '''
         minN = dynParameters.minN
         iter_error_thresh = dynParameters.iterative_error_threshold
+        horizonLength = len(A_matrices)
+        dofs = np.arange(self.dof_vel)
+
+        # Kept keypoints of every dof as flat arrays, sorted by dof then timestep
+        previousDofs = np.repeat(dofs, [len(dofKeyPoints) for dofKeyPoints in previousKeyPoints])
+        previous = np.concatenate([np.zeros(0, dtype=int)] + [np.asarray(dofKeyPoints, dtype=int) for dofKeyPoints in previousKeyPoints])
+        shifted = previous - shift
+        kept = (previous != horizonLength - 1) & (shifted >= 0) & (shifted < horizonLength)
+        keptKeys = np.unique(previousDofs[kept] * horizonLength + shifted[kept])
+        keptDofs, keptIndices = keptKeys // horizonLength, keptKeys % horizonLength
+
+        # Head and tail of each dof, the whole horizon for a dof with no kept keypoints. Only keypoints
+        # with a neighbour on both sides can be pruned, so the first and last kept keypoints stay.
+        firstPositions = np.searchsorted(keptDofs, dofs, side='left')
+        lastPositions = np.searchsorted(keptDofs, dofs, side='right') - 1
+        hasKept = lastPositions >= firstPositions
+        keptOrEnd = np.append(keptIndices, horizonLength - 1)
+        firstKept = np.where(hasKept, keptOrEnd[firstPositions], horizonLength - 1)
+        lastKept = np.where(hasKept, keptOrEnd[lastPositions], horizonLength - 1)
+
+        # Segment j of the kept keypoints runs from kept keypoint j to j + 1, when both are of the same dof
+        sameDof = keptDofs[:-1] == keptDofs[1:]
+        keptSegments = np.flatnonzero(sameDof)
+        segmentStarts = np.concatenate((keptIndices[keptSegments], np.zeros(self.dof_vel, dtype=int), lastKept))
+        segmentEnds = np.concatenate((keptIndices[keptSegments + 1], firstKept, np.full(self.dof_vel, horizonLength - 1)))
+        segmentDofs = np.concatenate((keptDofs[keptSegments], dofs, dofs))
+        isNew = np.arange(len(segmentStarts)) >= len(keptSegments)
+        isSegment = segmentEnds > segmentStarts
+        segmentStarts, segmentEnds, segmentDofs, isNew = segmentStarts[isSegment], segmentEnds[isSegment], segmentDofs[isSegment], isNew[isSegment]
+        segmentsChecked = np.flatnonzero((segmentEnds - segmentStarts) > minN)
+
+        # A kept keypoint between two segments is a pruning candidate, checked at itself and at the
+        # midpoint of the segment it would merge
+        middle = np.flatnonzero(sameDof[:-1] & sameDof[1:]) + 1
+        merged = middle[(keptIndices[middle + 1] - keptIndices[middle - 1]) > minN]
+
+        startIndices = np.concatenate((segmentStarts[segmentsChecked], keptIndices[merged - 1], keptIndices[middle - 1]))
+        endIndices = np.concatenate((segmentEnds[segmentsChecked], keptIndices[merged + 1], keptIndices[middle + 1]))
+        checkIndices = np.concatenate(((startIndices + endIndices)[:len(segmentsChecked) + len(merged)] // 2, keptIndices[middle]))
+        checkDofs = np.concatenate((segmentDofs[segmentsChecked], keptDofs[merged], keptDofs[middle]))
+        passes = self.midpointErrors(A_matrices, startIndices, endIndices, checkDofs, checkIndices) < iter_error_thresh
+
+        segmentFails = np.zeros(len(segmentStarts), dtype=bool)
+        segmentFails[segmentsChecked] = ~passes[:len(segmentsChecked)]
+        keptFails = np.zeros(len(sameDof), dtype=bool)
+        keptFails[keptSegments[isSegment[:len(keptSegments)]]] = segmentFails[~isNew]
+        mergedFails = np.zeros(len(keptIndices), dtype=bool)
+        mergedFails[merged] = ~passes[len(segmentsChecked):len(segmentsChecked) + len(merged)]
+
+        # A kept keypoint between two valid segments is redundant when the interpolation between its
+        # neighbours is good at it and the merged segment is valid. Of consecutive redundant keypoints
+        # only every other one is pruned, so the merged segments don't overlap.
+        redundant = np.zeros(len(keptIndices), dtype=bool)
+        redundant[middle] = passes[len(segmentsChecked) + len(merged):] & ~mergedFails[middle] & ~keptFails[middle - 1] & ~keptFails[middle]
+        positions = np.arange(len(keptIndices))
+        runStarts = np.maximum.accumulate(np.where(redundant & ~np.concatenate(([False], redundant[:-1])), positions, 0))
+        pruned = redundant & ((positions - runStarts) % 2 == 0)
+
+        # Failed segments are split at their midpoint, which is a keypoint, and each half is bisected.
+        # A valid head or tail keeps its midpoint.
+        segmentMids = (segmentStarts + segmentEnds) // 2
+        addsMid = segmentFails | isNew
+        failedStarts, failedMids, failedEnds, failedDofs = segmentStarts[segmentFails], segmentMids[segmentFails], segmentEnds[segmentFails], segmentDofs[segmentFails]
+        acceptedDofs, acceptedIndices = self.bisectSegments(A_matrices, np.concatenate((failedStarts, failedMids)), np.concatenate((failedMids, failedEnds)),
+                                                            np.concatenate((failedDofs, failedDofs)), minN, iter_error_thresh)
+
+        acceptedDofs = np.concatenate((acceptedDofs, keptDofs[~pruned], segmentDofs[addsMid]))
+        acceptedIndices = np.concatenate((acceptedIndices, keptIndices[~pruned], segmentMids[addsMid]))
+
+        # Every dof starts and ends on the horizon's boundaries
+        keys = np.unique(np.concatenate((dofs * horizonLength, dofs * horizonLength + horizonLength - 1, acceptedDofs * horizonLength + acceptedIndices)))
+        splits = [0] + np.searchsorted(keys, np.arange(1, self.dof_vel + 1) * horizonLength).tolist()
+        keyPoints = (keys % horizonLength).tolist()
+
+        return [keyPoints[splits[i]:splits[i + 1]] for i in range(self.dof_vel)]
+
+    def midpointErrors(self, A_matrices, startIndices, endIndices, dofNums, checkIndices = None):
+        '''
+        Vectorised midpointError, the midpoint errors of many segments (each for its own dof) at once.
+        Gives the same values as calling midpointError on each segment.
 
-        startIndex = 0
-        endIndex = self.trajecLength - 1
+        checkIndices optionally gives the timestep to check in each segment instead of the midpoint,
+        it is compared against the linear interpolation of the segment at that timestep. A check index
+        at the segment's midpoint is scored as its midpoint error, so both kinds of check can be mixed.
 
-        for i in range(self.dof_vel):
-            binComplete = False
-            listofIndicesCheck = []
-            indexTuple = (startIndex, endIndex)
-            listofIndicesCheck.append(indexTuple)
-            subListIndices = []
-            subListWithMidpoints = []
-
-            while(not binComplete):
-
-                allChecksComplete = True
-                for j in range(len(listofIndicesCheck)):
-
-                    approximationGood, midIndex = self.oneCheck(trajectoryStates, listofIndicesCheck[j], i, minN, iter_error_thresh)
-
-                    if not approximationGood:
-                        allChecksComplete = False
-                        
-                        indexTuple1 = (listofIndicesCheck[j][0], midIndex)
-                        indexTuple2 = (midIndex, listofIndicesCheck[j][1])
-                        subListIndices.append(indexTuple1)
-                        subListIndices.append(indexTuple2)
-                    else:
-                        subListWithMidpoints.append(listofIndicesCheck[j][0])
-                        subListWithMidpoints.append(midIndex)
-                        subListWithMidpoints.append(listofIndicesCheck[j][1])
-
-                if(allChecksComplete):
-                    binComplete = True
-                    for k in range(len(subListWithMidpoints)):
-                        keyPoints[i].append(subListWithMidpoints[k])
-
-                    subListWithMidpoints = []
-
-                listofIndicesCheck = subListIndices.copy()
-                subListIndices = []
+        '''
+        midpoints = checkIndices is None
+        if midpoints:
+            checkIndices = (startIndices + endIndices) // 2
+
+        # Only the position and velocity columns of each segment's dof are scored, so only those are gathered, (S, 2, n)
+        columns = self.dof_columns[dofNums]
+        startVals = A_matrices[startIndices[:, None], :, columns]
+        endVals = A_matrices[endIndices[:, None], :, columns]
+        trueMidVals = A_matrices[checkIndices[:, None], :, columns]
+        diff = endVals - startVals
 
-        for i in range(self.dof_vel):
-            keyPoints[i].sort()
-            keyPoints[i] = list(dict.fromkeys(keyPoints[i]))
+        if midpoints:
+            linInterpMidVals = startVals + (diff/2)
+        else:
+            fractions = np.where(checkIndices == (startIndices + endIndices) // 2, 0.5, (checkIndices - startIndices) / (endIndices - startIndices))
+            linInterpMidVals = startVals + (diff * fractions.astype(A_matrices.dtype)[:, None, None])
+
+        sq_diff = (trueMidVals - linInterpMidVals) ** 2
+        # Summed per column in the same order as meansqDiffBetweenAMatrices
+        sum_sq_diff = 0 + sq_diff[:, 0].sum(axis=1)
+        sum_sq_diff = sum_sq_diff + sq_diff[:, 1].sum(axis=1)
+
+        return sum_sq_diff / (2 * self.dof_vel)
+
+    def keyPoints_iterativelyPrioritised(self, A_matrices, dynParameters):
+        '''
+        Priority version of keyPoints_iteratively. Rather than bisecting every segment level by level,
+        segments are split worst midpoint error first over all dofs. Splitting stops once the worst error
+        is below iterative_error_threshold, or when the next split would take the number of keypoints
+        over keyPoint_budget.
+
+        The segments over the threshold are held as flat arrays like bisectSegments. Each round sorts
+        them worst first and splits them in that order, up to the first split that doesn't fit the
+        budget, then scores the halves of all of them with one midpointErrors call. Sorting only orders
+        the segments, the scoring is never done one segment at a time.
+
+        Every checked midpoint is a keypoint (its derivatives have to be evaluated to measure the error),
+        so keyPoint_budget bounds the number of derivative evaluations. Without a budget the keypoints
+        are the same as keyPoints_iteratively. Both endpoints of every dof are always keypoints, a
+        budget below 2 * dof_vel is clamped to them.
+
+        '''
+        minN = dynParameters.minN
+        iter_error_thresh = dynParameters.iterative_error_threshold
+        lastIndex = self.trajecLength - 1
+
+        numKeyPoints = self.dof_vel * len(set([0, lastIndex]))
+        keyPointBudget = dynParameters.keyPoint_budget
+        if(keyPointBudget is not None):
+            keyPointBudget = max(keyPointBudget, numKeyPoints)
+
+        # A split adds the midpoint of each half, which is only new if the half is at least two timesteps long
+        def newKeyPoints(startIndices, midIndices, endIndices):
+            return ((midIndices - startIndices) >= 2).astype(int) + ((endIndices - midIndices) >= 2)
+
+        # The root segment of each dof adds its midpoint, dofs are added in order while they fit the budget
+        numRoots = self.dof_vel
+        rootNew = int(lastIndex >= 2)
+        if(keyPointBudget is not None and rootNew > 0):
+            numRoots = min(self.dof_vel, (keyPointBudget - numKeyPoints) // rootNew)
+        numKeyPoints += numRoots * rootNew
+
+        keyPointDofs = [np.arange(self.dof_vel), np.arange(self.dof_vel), np.arange(numRoots)]
+        keyPointIndices = [np.zeros(self.dof_vel, dtype=int), np.full(self.dof_vel, lastIndex), np.full(numRoots, lastIndex // 2)]
+
+        dofNums = np.arange(numRoots)
+        startIndices = np.zeros(numRoots, dtype=int)
+        endIndices = np.full(numRoots, lastIndex)
+        midErrors = np.zeros(0)
+
+        while(True):
+            # Score the new segments, only those over the threshold can be split
+            toCheck = (endIndices[len(midErrors):] - startIndices[len(midErrors):]) > minN
+            newErrors = np.full(len(toCheck), -np.inf)
+            if(toCheck.any()):
+                offset = len(midErrors)
+                newErrors[toCheck] = self.midpointErrors(A_matrices, startIndices[offset:][toCheck], endIndices[offset:][toCheck], dofNums[offset:][toCheck])
+                # A NaN error never passes the threshold check, so it is split first
+                newErrors[np.isnan(newErrors)] = np.inf
+            midErrors = np.concatenate((midErrors, newErrors))
+
+            overThreshold = midErrors >= iter_error_thresh
+            dofNums, startIndices, endIndices, midErrors = dofNums[overThreshold], startIndices[overThreshold], endIndices[overThreshold], midErrors[overThreshold]
+
+            # Without a budget every segment over the threshold is split, so the order only matters with one.
+            # Worst error first, ties broken by dof then start index.
+            numSplit = len(midErrors)
+            if(keyPointBudget is not None):
+                order = np.lexsort((startIndices, dofNums, -midErrors))
+                dofNums, startIndices, endIndices, midErrors = dofNums[order], startIndices[order], endIndices[order], midErrors[order]
+            midIndices = (startIndices + endIndices) // 2
+
+            if(keyPointBudget is not None):
+                fits = np.cumsum(newKeyPoints(startIndices, midIndices, endIndices)) <= keyPointBudget - numKeyPoints
+                numSplit = len(fits) if fits.all() else int(np.argmin(fits))
+            if(numSplit == 0):
+                break
+
+            split = slice(0, numSplit)
+            numKeyPoints += int(np.sum(newKeyPoints(startIndices[split], midIndices[split], endIndices[split])))
+            childStarts = np.concatenate((startIndices[split], midIndices[split]))
+            childEnds = np.concatenate((midIndices[split], endIndices[split]))
+            childDofs = np.concatenate((dofNums[split], dofNums[split]))
+            keyPointDofs.append(childDofs)
+            keyPointIndices.append((childStarts + childEnds) // 2)
+
+            # Unsplit segments keep their errors, the children are appended to be scored
+            dofNums = np.concatenate((dofNums[numSplit:], childDofs))
+            startIndices = np.concatenate((startIndices[numSplit:], childStarts))
+            endIndices = np.concatenate((endIndices[numSplit:], childEnds))
+            midErrors = midErrors[numSplit:]
+
+        keyPointDofs = np.concatenate(keyPointDofs)
+        keyPointIndices = np.concatenate(keyPointIndices)
+
+        return [np.unique(keyPointIndices[keyPointDofs == i]).tolist() for i in range(self.dof_vel)]
 
-        return keyPoints
-        
     def oneCheck(self, A_matrices, indexTuple, dofNum, minN, iter_error_thresh):
         approximationGood = False
 
@@ -562,17 +1300,11 @@ class interpolator():
         endIndex = indexTuple[1]
 
         midIndex = int((startIndex + endIndex) / 2)
-        startVals = A_matrices[startIndex,:]
-        endVals = A_matrices[endIndex,:]
 
         if((endIndex - startIndex) <= minN):
             return True, midIndex
 
-        trueMidVals = A_matrices[midIndex,:]
-        diff = endVals - startVals
-        linInterpMidVals = startVals + (diff/2)
-
-        meanSqDiff = self.meansqDiffBetweenAMatrices(trueMidVals, linInterpMidVals, dofNum)
+        meanSqDiff = self.midpointError(A_matrices, indexTuple, dofNum)
         # print("meanSqDiff: " + str(meanSqDiff))
 
         # 0.05 for reaching and pushing
@@ -583,6 +1315,21 @@ class interpolator():
 
         return approximationGood, midIndex
 
+    def midpointError(self, A_matrices, indexTuple, dofNum):
+        # Error at the midpoint of a segment between the true A matrix and linear interpolation of its ends
+        startIndex = indexTuple[0]
+        endIndex = indexTuple[1]
+
+        midIndex = int((startIndex + endIndex) / 2)
+        startVals = A_matrices[startIndex,:]
+        endVals = A_matrices[endIndex,:]
+
+        trueMidVals = A_matrices[midIndex,:]
+        diff = endVals - startVals
+        linInterpMidVals = startVals + (diff/2)
+
+        return self.meansqDiffBetweenAMatrices(trueMidVals, linInterpMidVals, dofNum)
+
     def meanSqDiffMatrices(self, matrix1, matrix2):
         meanSqDiff = 0
         sumsqDiff = 0
@@ -619,10 +1366,10 @@ class interpolator():
         sum_sq_diff = 0
         counter = 0
         counterSmallVals = 0
-        offsets = [0, self.dof_pos]
+        column_indices = [self.pos_columns[dofNum], self.vel_columns[dofNum]]
 
         for i in range(2):
-            column_index = offsets[i] + dofNum
+            column_index = column_indices[i]
             sq_diff_column = (matrix1[:,column_index] - matrix2[:,column_index]) ** 2
             sum_sq_diff += sq_diff_column.sum()
 
@@ -630,63 +1377,229 @@ class interpolator():
         
         return mean_sq_diff
     
-    def generateLinInterpolation(self, A_matrices, B_matrices, reEvaluationIndicies, key_points_w):
-        A_linInterpolationData = np.zeros((self.trajecLength, self.num_states, self.num_states))
-        B_linInterpolationData = np.zeros((self.trajecLength, self.num_states, self.num_ctrl))
+    def returnColumnKeyPoints(self, matrixType, column, reEvaluationIndicies, key_points_w):
+        # Keypoints generateLinInterpolation uses for a column of the A or B matrices, None if it leaves the column at zero
+        if(matrixType == "A"):
+            if column in self.pos_columns:
+                return reEvaluationIndicies[np.flatnonzero(self.pos_columns == column)[0]]
+            if column in self.vel_columns:
+                return reEvaluationIndicies[np.flatnonzero(self.vel_columns == column)[0]]
+            if column in self.quat_w_indices and len(key_points_w):
+                return key_points_w
+        elif(column < self.num_ctrl and column < self.dof_vel):
+            return reEvaluationIndicies[column]
+
+        return None
+
+    def generateSparseLinInterpolation(self, sparse, matrixType, reEvaluationIndicies, key_points_w):
+        '''
+        generateLinInterpolation of the time-varying entries of sparse, returns the (T, nnz) interpolated
+        values. Every entry is interpolated at once with the segments of its column.
 
-        for i in range(self.dof_vel):
-            for j in range(len(reEvaluationIndicies[i]) - 1):
-                    
-                start_index = reEvaluationIndicies[i][j]
-                end_index = reEvaluationIndicies[i][j + 1]
+        '''
+        columns, entryColumns = np.unique(sparse.colIndices, return_inverse=True)
+        columnKeyPoints = []
+        for column in columns:
+            keyPoints = self.returnColumnKeyPoints(matrixType, column, reEvaluationIndicies, key_points_w)
+            columnKeyPoints.append([] if keyPoints is None else keyPoints)
+
+        startIndices, endIndices, weights, inSegment = self.linInterpolationSegments(columnKeyPoints)
+
+        # (T, nnz) start and end values of the segment every entry is in
+        entries = np.arange(sparse.values.shape[1])
+        startVals = sparse.values[startIndices[:, entryColumns], entries]
+        diff = sparse.values[endIndices[:, entryColumns], entries] - startVals
+        interpolation = np.where(inSegment[:, entryColumns], startVals + (diff * weights[:, entryColumns].astype(sparse.values.dtype)), 0).astype(self.dtype, copy=False)
+
+        # Same end of trajectory handling as generateLinInterpolation, the last B matrix is left at zero
+        if(matrixType == "A"):
+            interpolation[len(interpolation) - 1] = interpolation[len(interpolation) - 2]
 
-                # take the column values at start and end index
-                startVals_pos = A_matrices[start_index, :, i]
-                startVals_vel = A_matrices[start_index, :, i + self.dof_pos]
+        return interpolation
 
-                if(i < self.num_ctrl):
-                    startVals_B = B_matrices[start_index, :, i]
+    def calcErrorOverTrajectorySparse(self, sparse, matrixType, interpolation, reEvaluationIndicies, key_points_w):
+        '''
+        calcErrorOverTrajectory on the sparseMatrices split. Constant entries are reproduced exactly by the
+        interpolation, so they only add error where generateLinInterpolation leaves them at zero.
 
-                endVals_pos = A_matrices[end_index, :, i]
-                endVals_vel = A_matrices[end_index, :, i + self.dof_pos]
+        '''
+        sum_abs_diff = np.sum(np.abs(sparse.values - interpolation), dtype=np.float64)
 
-                if(i < self.num_ctrl):
-                    endVals_B = B_matrices[end_index, :, i]
+        for entry in sparse.constantIndices:
+            if sparse.constantValues[entry] == 0:
+                continue
 
-                interval = end_index - start_index
-                diff_pos = endVals_pos - startVals_pos
-                diff_vel = endVals_vel - startVals_vel
-                if(i < self.num_ctrl):
-                    diff_B = endVals_B - startVals_B
+            # Timesteps generateLinInterpolation leaves at zero, outside the column's first and last
+            # keypoint, the last A matrix is a copy of the second to last
+            column = entry % sparse.numCols
+            columnKeyPoints = self.returnColumnKeyPoints(matrixType, column, reEvaluationIndicies, key_points_w)
+            covered = np.zeros(sparse.trajecLength, dtype=bool)
+            if columnKeyPoints is not None and len(columnKeyPoints) >= 2:
+                covered[columnKeyPoints[0]:columnKeyPoints[-1]] = True
+            if(matrixType == "A"):
+                covered[-1] = covered[-2]
 
-                for k in range(interval):
-                    A_linInterpolationData[start_index + k, :, i] = startVals_pos + (diff_pos * (k / interval))
-                    A_linInterpolationData[start_index + k, :, i + self.dof_pos] = startVals_vel + (diff_vel * (k / interval))
+            sum_abs_diff += abs(sparse.constantValues[entry]) * np.count_nonzero(~covered)
 
-                    if(i < self.num_ctrl):
-                        B_linInterpolationData[start_index + k, :, i] = startVals_B + (diff_B * (k / interval))
+        MAE = sum_abs_diff / (sparse.trajecLength * sparse.numRows * sparse.numCols)
 
-        # Handle any quaternions w interpolation
-        for i in range(len(self.quat_w_indices)):
-            for j in range(len(key_points_w) - 1):
-                start_index = key_points_w[j]
-                end_index = key_points_w[j + 1]
+        return MAE
 
-                startVals = A_matrices[start_index, :, self.quat_w_indices[i]]
-                endVals = A_matrices[end_index, :, self.quat_w_indices[i]]
+    def generateLinInterpolation(self, A_matrices, B_matrices, reEvaluationIndicies, key_points_w):
+        '''
+        Linearly interpolate the A and B matrices between keypoints. Each dof's keypoints are used for
+        its position and velocity columns of A and its column of B (for dofs < num_ctrl), the
+        quaternion w columns use key_points_w. All other columns are left at zero, as is the last
+        B matrix, the last A matrix is a copy of the second to last.
 
-                diff = endVals - startVals
-                interval = end_index - start_index
+        '''
+        A_linInterpolationData = np.zeros((self.trajecLength, self.num_states, self.num_states), dtype=self.dtype)
+        B_linInterpolationData = np.zeros((self.trajecLength, self.num_states, self.num_ctrl), dtype=self.dtype)
 
-                A_linInterpolationData[start_index, :, self.quat_w_indices[i]] = startVals
+        A_columns = np.concatenate((self.pos_columns, self.vel_columns)).astype(int)
+        A_columnKeyPoints = list(reEvaluationIndicies[0:self.dof_vel]) * 2
+        self.fillLinInterpolation(A_matrices, A_linInterpolationData, A_columns, A_columnKeyPoints)
 
-                for k in range(1, interval):
-                    A_linInterpolationData[start_index + k, :, self.quat_w_indices[i]] = startVals + (diff * (k / interval))
+        B_columns = np.arange(min(self.num_ctrl, self.dof_vel))
+        self.fillLinInterpolation(B_matrices, B_linInterpolationData, B_columns, [reEvaluationIndicies[i] for i in B_columns])
+
+        # Handle any quaternions w interpolation, the first timestep of each segment is copied exactly
+        if(len(key_points_w) > 0):
+            self.fillLinInterpolation(A_matrices, A_linInterpolationData, np.asarray(self.quat_w_indices, dtype=int),
+                                      [key_points_w] * len(self.quat_w_indices), exactStart=True)
 
         A_linInterpolationData[len(A_linInterpolationData) - 1,:] = A_linInterpolationData[len(A_linInterpolationData) - 2,:]
 
         return A_linInterpolationData, B_linInterpolationData
-    
+
+    def generateInterpolation(self, A_matrices, B_matrices, reEvaluationIndicies, key_points_w, interpolationMethod = "linear"):
+        '''
+        Interpolate the A and B matrices between keypoints with one of INTERPOLATION_METHODS. The
+        columns interpolated, and the handling of the last A and B matrices, are the same as
+        generateLinInterpolation, which is used for linear interpolation.
+
+        '''
+        if(interpolationMethod == "linear"):
+            return self.generateLinInterpolation(A_matrices, B_matrices, reEvaluationIndicies, key_points_w)
+
+        A_interpolation = self.returnInterpolatedMatrices("A", A_matrices, [reEvaluationIndicies], key_points_w, [interpolationMethod])
+        B_interpolation = self.returnInterpolatedMatrices("B", B_matrices, [reEvaluationIndicies], key_points_w, [interpolationMethod])
+
+        return A_interpolation[0], B_interpolation[0]
+
+    def keyPointSlopes(self, keyPoints, keyPointValues, interpolationMethod):
+        '''
+        (K, rows) slopes over time at the keypoints of the cubic Hermite segments of interpolationMethod,
+        None for linear interpolation. Slopes are computed in float64 for every entry of the column at once.
+
+        '''
+        if(interpolationMethod == "linear" or len(keyPoints) < 2):
+            return None
+
+        keyPointValues = keyPointValues.astype(np.float64)
+        if(interpolationMethod == "cubicHermite"):
+            return PchipInterpolator(keyPoints, keyPointValues, axis=0).derivative()(keyPoints)
+        elif(interpolationMethod == "naturalCubicSpline"):
+            return CubicSpline(keyPoints, keyPointValues, axis=0, bc_type="natural").derivative()(keyPoints)
+
+        raise ValueError("unknown interpolation method " + str(interpolationMethod) + ", methods are " + str(INTERPOLATION_METHODS))
+
+    def returnInterpolatedMatrices(self, matrixType, matrices, keyPoints, key_points_w, interpolationMethods = None):
+        '''
+        Lazy interpolatedMatrices view of generateInterpolation for every parameter set in keyPoints,
+        only the matrix columns at each column's keypoints are kept. interpolationMethods gives the
+        kernel of each parameter set, all linear by default.
+
+        '''
+        numCols = self.num_states if matrixType == "A" else self.num_ctrl
+        if interpolationMethods is None:
+            interpolationMethods = ["linear"] * len(keyPoints)
+        columnSpecs = []
+
+        # Reads of the trajectory's own A and B columns are recorded as derivative evaluations
+        cached = matrices is self.__dict__.get("A_matrices" if matrixType == "A" else "B_matrices")
+
+        for parameterKeyPoints, interpolationMethod in zip(keyPoints, interpolationMethods):
+            # (column, keypoints, dof), quaternion w columns don't belong to a dof
+            if(matrixType == "A"):
+                dofs = range(self.dof_vel)
+                columnKeyPoints = [(self.pos_columns[i], parameterKeyPoints[i], i) for i in dofs] + [(self.vel_columns[i], parameterKeyPoints[i], i) for i in dofs]
+                exactStart = [False] * len(columnKeyPoints)
+                if(len(key_points_w) > 0):
+                    columnKeyPoints += [(column, key_points_w, None) for column in self.quat_w_indices]
+                    exactStart += [True] * len(self.quat_w_indices)
+            else:
+                columnKeyPoints = [(column, parameterKeyPoints[column], column) for column in range(min(self.num_ctrl, self.dof_vel))]
+                exactStart = [False] * len(columnKeyPoints)
+
+            specs = []
+            for (column, columnKeys, dof), columnExactStart in zip(columnKeyPoints, exactStart):
+                columnKeys = np.asarray(columnKeys, dtype=int)
+                if(interpolationMethod != "linear"):
+                    # Repeated keypoints never start a segment, the cubic kernels need distinct ones
+                    columnKeys = np.unique(columnKeys)
+                if(cached and dof is not None):
+                    keyPointValues = self.returnDerivativeColumn(matrixType, column, dof, columnKeys)
+                else:
+                    keyPointValues = matrices[columnKeys, :, column]
+                specs.append((int(column), columnKeys, keyPointValues, columnExactStart, self.keyPointSlopes(columnKeys, keyPointValues, interpolationMethod)))
+            columnSpecs.append(specs)
+
+        return interpolatedMatrices(columnSpecs, self.trajecLength, self.num_states, numCols, self.dtype, matrixType == "A")
+
+    def linInterpolationSegments(self, columnKeyPoints):
+        '''
+        Interpolation weights for a set of columns, each with its own sorted keypoints. Returns (T, C)
+        arrays of the start and end keypoint of the segment every timestep falls in, its weight
+        (timestep - start) / (end - start), and whether the timestep is inside [first, last) keypoint.
+
+        '''
+        numColumns = len(columnKeyPoints)
+        timesteps = np.arange(self.trajecLength)
+
+        startIndices = np.zeros((self.trajecLength, numColumns), dtype=int)
+        endIndices = np.zeros((self.trajecLength, numColumns), dtype=int)
+        inSegment = np.zeros((self.trajecLength, numColumns), dtype=bool)
+
+        for c in range(numColumns):
+            keyPoints = np.asarray(columnKeyPoints[c], dtype=int)
+            if(len(keyPoints) < 2):
+                continue
+
+            segments = np.clip(np.searchsorted(keyPoints, timesteps, side="right") - 1, 0, len(keyPoints) - 2)
+            startIndices[:, c] = keyPoints[segments]
+            endIndices[:, c] = keyPoints[segments + 1]
+            inSegment[:, c] = (timesteps >= startIndices[:, c]) & (timesteps < endIndices[:, c])
+
+        intervals = np.where(inSegment, endIndices - startIndices, 1)
+        weights = (timesteps[:, None] - startIndices) / intervals
+
+        return startIndices, endIndices, weights, inSegment
+
+    def fillLinInterpolation(self, matrices, interpolation, columns, columnKeyPoints, exactStart = False):
+        '''
+        Write the linear interpolation of the given matrix columns between their keypoints into
+        interpolation, gathering every column at once. Timesteps outside a column's keypoints are
+        left untouched.
+
+        '''
+        if(len(columns) == 0):
+            return
+
+        startIndices, endIndices, weights, inSegment = self.linInterpolationSegments(columnKeyPoints)
+
+        # (T, C, rows) start and end values of each column
+        startVals = matrices[startIndices, :, columns]
+        endVals = matrices[endIndices, :, columns]
+
+        diff = endVals - startVals
+        # The weights are computed in float64 and applied in the matrices' precision
+        values = startVals + (diff * weights.astype(matrices.dtype)[:, :, None])
+        if(exactStart):
+            values = np.where((weights == 0)[:, :, None], startVals, values)
+
+        interpolation[:, :, columns] = np.where(inSegment[:, :, None], values, interpolation[:, :, columns].transpose(0, 2, 1)).transpose(0, 2, 1)
+
     def butter_lowpass_filter(self, data, cutoff, nyq, order):
         normal_cutoff = cutoff / nyq
         # Get the filter coefficients 
@@ -694,6 +1607,32 @@ class interpolator():
         y = filtfilt(b, a, data)
         return y
 
+# --------------------------------- Built in keypoint methods -------------------------------------
+
+@registerKeypointMethod("setInterval", ())
+def keypointMethod_setInterval(myInterpolator, signals, dynParameters):
+    return myInterpolator.keyPoints_setInterval(dynParameters)
+
+@registerKeypointMethod("adaptiveJerk", ("jerkProfile",))
+def keypointMethod_adaptiveJerk(myInterpolator, signals, dynParameters):
+    return myInterpolator.keyPoints_adaptiveThreshold(signals["jerkProfile"], 1, dynParameters, dynParameters.jerkThreshold)
+
+@registerKeypointMethod("adaptiveAccel", ("accelProfile",))
+def keypointMethod_adaptiveAccel(myInterpolator, signals, dynParameters):
+    return myInterpolator.keyPoints_adaptiveThreshold(signals["accelProfile"], 0, dynParameters, dynParameters.acellThreshold)
+
+@registerKeypointMethod("iterativeError", ("A_matrices",))
+def keypointMethod_iterativeError(myInterpolator, signals, dynParameters):
+    return myInterpolator.keyPoints_iteratively(signals["A_matrices"], dynParameters)
+
+@registerKeypointMethod("iterativeErrorPriority", ("A_matrices",))
+def keypointMethod_iterativeErrorPriority(myInterpolator, signals, dynParameters):
+    return myInterpolator.keyPoints_iterativelyPrioritised(signals["A_matrices"], dynParameters)
+
+@registerKeypointMethod("magVelChange", ("states", "controls"))
+def keypointMethod_magVelChange(myInterpolator, signals, dynParameters):
+    return myInterpolator.keyPoints_magVelChange(signals["states"], signals["controls"], dynParameters)
+
 def testFilter():
     pass
 
@@ -9,6 +9,10 @@ class derivative_interpolator():
     jerkThreshold: float
     iterative_error_threshold: float
     vel_change_required: float
+    # iterativeErrorPriority only - maximum number of keypoints summed over all dofs (raised to 2 per dof if lower), None for no limit
+    keyPoint_budget: int = None
+    # Kernel used between keypoints, one of INTERPOLATION_METHODS in interpolateDynamics.py
+    interpolation_method: str = "linear"
 
 def return_interpolation_settings(task_name):
     interpolation_settings = []
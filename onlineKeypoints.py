@@ -0,0 +1,148 @@
+import numpy as np
+
+# Incremental versions of the adaptiveJerk, adaptiveAccel and magVelChange keypoint rules, for use
+# inside a control loop (e.g. MPC) where states arrive one timestep at a time. Fed the states of a
+# trajectory one by one, a detector places exactly the keypoints the offline methods in
+# interpolateDynamics.py place for the whole trajectory.
+
+ONLINE_KEYPOINT_METHODS = ("adaptiveJerk", "adaptiveAccel", "magVelChange")
+
+class onlineKeypointDetector():
+    '''
+    Streaming keypoint detector for one parameter set (derivative_interpolator). addState takes the
+    next state and returns (decisionTimestep, evaluate), evaluate[i] is True when dof i needs its
+    derivatives evaluated at decisionTimestep. Each step is O(dof) work.
+
+    The jerk and acceleration at a timestep depend on the states after it, so those rules decide
+    about earlier timesteps: adaptiveJerk decides timestep t - 2 and adaptiveAccel timestep t - 1 when
+    state t is added, magVelChange decides timestep t itself. decisionTimestep is None when there is
+    nothing to decide yet. The first timestep is always a keypoint.
+
+    '''
+    DECISION_LAG = {"adaptiveJerk": 2, "adaptiveAccel": 1, "magVelChange": 0}
+
+    def __init__(self, dof_pos, dof_vel, dynParameters):
+        if dynParameters.keyPoint_method not in ONLINE_KEYPOINT_METHODS:
+            raise ValueError("no online detector for keypoint method " + str(dynParameters.keyPoint_method) + ", online methods are " + str(ONLINE_KEYPOINT_METHODS))
+
+        self.dof_pos = dof_pos
+        self.dof_vel = dof_vel
+        self.dynParameters = dynParameters
+        self.keyPoint_method = dynParameters.keyPoint_method
+        self.decisionLag = onlineKeypointDetector.DECISION_LAG[self.keyPoint_method]
+
+        self.reset()
+
+    def reset(self):
+        # Number of states added so far
+        self.numStates = 0
+        self.keyPoints = [[] for x in range(self.dof_vel)]
+
+        # Last two velocity vectors, as stored in the states
+        self.lastVelocities = None
+        self.secondLastVelocities = None
+
+        self.counter = np.zeros(self.dof_vel, dtype=int)
+
+        # magVelChange only - velocity at the last keypoint and last change in velocity, both float64
+        # as in keyPoints_magVelChange
+        self.lastVelCounter = np.zeros(self.dof_vel)
+        self.lastVelDirection = np.zeros(self.dof_vel)
+
+    def addState(self, state):
+        timestep = self.numStates
+        self.numStates += 1
+
+        velocities = np.array(state[self.dof_pos:self.dof_pos + self.dof_vel])
+
+        if(timestep == 0):
+            evaluate = np.ones(self.dof_vel, dtype=bool)
+            if(self.keyPoint_method == "magVelChange"):
+                self.lastVelCounter[:] = velocities
+        elif(self.keyPoint_method == "magVelChange"):
+            evaluate = self.stepMagVelChange(velocities, timestep)
+        elif(self.keyPoint_method == "adaptiveAccel"):
+            # Acceleration at timestep - 1, accelProfile[j] = v[j + 1] - v[j]
+            accel = np.zeros(self.dof_vel)
+            accel[:] = velocities - self.lastVelocities
+            evaluate = self.stepAdaptiveThreshold(accel, self.dynParameters.acellThreshold, timestep - 1)
+        elif(timestep >= 3):
+            # Jerk at timestep - 2, keeping the historic (state1 - state1) - (state3 - state2) form
+            jerk = np.zeros(self.dof_vel)
+            jerk[:] = (self.secondLastVelocities - self.secondLastVelocities) - (velocities - self.lastVelocities)
+            evaluate = self.stepAdaptiveThreshold(jerk, self.dynParameters.jerkThreshold, timestep - 2)
+        else:
+            # The jerk rule starts at jerk index 1, so there is nothing to decide for timesteps 1 and 2
+            evaluate = None
+
+        self.secondLastVelocities = self.lastVelocities
+        self.lastVelocities = velocities
+
+        if(timestep == 0):
+            for i in range(self.dof_vel):
+                self.keyPoints[i].append(0)
+            return 0, evaluate
+
+        if evaluate is None:
+            return None, np.zeros(self.dof_vel, dtype=bool)
+
+        return timestep - self.decisionLag, evaluate
+
+    def stepAdaptiveThreshold(self, profileValues, threshold, decisionTimestep):
+        # Same order of checks as keyPoints_adaptiveThreshold walks through, a threshold crossing resets
+        # the counter before the maxN check
+        crossing = (profileValues > threshold) | (profileValues < -threshold)
+
+        crossingKeyPoint = (self.counter >= self.dynParameters.minN) & crossing
+        self.counter[crossingKeyPoint] = 0
+
+        maxKeyPoint = self.counter >= self.dynParameters.maxN
+        self.counter[maxKeyPoint] = 0
+
+        self.counter += 1
+
+        for i in np.flatnonzero(crossingKeyPoint):
+            self.keyPoints[i].append(decisionTimestep)
+        for i in np.flatnonzero(maxKeyPoint):
+            self.keyPoints[i].append(decisionTimestep)
+
+        return crossingKeyPoint | maxKeyPoint
+
+    def stepMagVelChange(self, velocities, timestep):
+        velChangeRequired = self.dynParameters.vel_change_required
+
+        self.counter += 1
+
+        currentVelDirection = velocities - self.lastVelocities
+        currentVelChange = velocities - self.lastVelCounter
+
+        velChangeKeyPoint = (currentVelChange > velChangeRequired) | (currentVelChange < -velChangeRequired)
+        maxKeyPoint = ~velChangeKeyPoint & (self.counter >= self.dynParameters.maxN)
+        directionKeyPoint = ~velChangeKeyPoint & ~maxKeyPoint & ((currentVelDirection * self.lastVelDirection) < 0) & (self.counter >= self.dynParameters.minN)
+
+        evaluate = velChangeKeyPoint | maxKeyPoint | directionKeyPoint
+        self.lastVelCounter[evaluate] = velocities[evaluate]
+        self.counter[maxKeyPoint | directionKeyPoint] = 0
+        self.lastVelDirection[:] = currentVelDirection
+
+        for i in np.flatnonzero(evaluate):
+            self.keyPoints[i].append(timestep)
+
+        return evaluate
+
+    def finish(self):
+        '''
+        End of the trajectory, the final timestep is added as a keypoint the same way the offline
+        method adds it. Returns the keypoints of every dof.
+
+        '''
+        if(self.numStates == 0):
+            return self.keyPoints
+
+        finalTimestep = self.numStates - 1
+
+        for i in range(self.dof_vel):
+            if(self.keyPoint_method != "magVelChange" or self.keyPoints[i][-1] != finalTimestep):
+                self.keyPoints[i].append(finalTimestep)
+
+        return self.keyPoints
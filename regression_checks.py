@@ -0,0 +1,1359 @@
+import numpy as np
+import time
+import os
+import shutil
+import warnings
+import interpolateDynamics
+from interpolateDynamics import *
+from trajecData import (TRAJEC_COMPONENTS, META_DATA_FILE, DATASET_KEY_FILE, taskPath, trajecPath, cachePath, datasetPath, readTrajecCSV,
+                        cacheValid, loadTrajecComponent, readTrajecChunks, buildTrajecCache, buildTaskDataset, buildTaskManifest,
+                        validTrajecNumbers, taskDataset)
+from interpolation_settings import return_interpolation_settings
+from onlineKeypoints import onlineKeypointDetector
+
+# Regression checks for the optimised parts of interpolateDynamics.py. Each check compares the
+# current implementation against the original element-by-element reference on the bundled
+# savedTrajecInfo trajectories.
+
+TASKS = ["acrobot", "piston_block"]
+
+# ------------------------------------ Reference implementations ------------------------------------
+
+def unpackMatrices_reference(flatMatrices, numRows, numCols):
+    matrices = np.zeros((len(flatMatrices), numRows, numCols))
+
+    for i in range(len(flatMatrices)):
+        for j in range(numRows):
+            for k in range(numCols):
+                matrices[i][j][k] = flatMatrices[i][j*numCols + k]
+
+    return matrices
+
+def keyPoints_setInterval_reference(myInterpolator, dynParameters):
+    keyPoints = [[] for x in range(myInterpolator.dof_vel)]
+
+    for i in range(myInterpolator.dof_vel):
+        keyPoints[i].append(0)
+
+    minN = dynParameters.minN
+
+    for i in range(myInterpolator.dof_vel):
+        counter = 0
+        for j in range(myInterpolator.trajecLength - 1):
+            counter += 1
+            if counter >= minN:
+                counter = 0
+                keyPoints[i].append(j)
+
+    for i in range(myInterpolator.dof_vel):
+        keyPoints[i].append(myInterpolator.trajecLength - 1)
+
+    return keyPoints
+
+def calculateAccellerationOverTrajectory_reference(myInterpolator, trajectoryStates):
+    acell = np.zeros((myInterpolator.trajecLength - 1, myInterpolator.dof_vel))
+
+    for i in range(myInterpolator.trajecLength - 1):
+
+        vel1 = trajectoryStates[i,myInterpolator.dof_pos:].copy()
+        vel2 = trajectoryStates[i+1,myInterpolator.dof_pos:].copy()
+
+        currentAccel = vel2 - vel1
+
+        acell[i,:] = currentAccel
+
+    return acell
+
+def calcJerkOverTrajectory_reference(myInterpolator, trajectoryStates):
+    jerk = np.zeros((myInterpolator.trajecLength - 2, myInterpolator.dof_vel))
+
+    for i in range(myInterpolator.trajecLength - 2):
+
+        state1 = trajectoryStates[i,myInterpolator.dof_pos:].copy()
+        state2 = trajectoryStates[i+1,myInterpolator.dof_pos:].copy()
+        state3 = trajectoryStates[i+2,myInterpolator.dof_pos:].copy()
+
+        accel1 = state3 - state2
+        accel2 = state1 - state1
+
+        currentJerk = accel2 - accel1
+
+        jerk[i,:] = currentJerk
+
+    return jerk
+
+def keyPoints_magVelChange_reference(myInterpolator, dynParameters):
+    trajectoryStates = myInterpolator.states
+    minN = dynParameters.minN
+    maxN = dynParameters.maxN
+    velChangeRequired = dynParameters.vel_change_required
+    dof_vel = myInterpolator.dof_vel
+    vel_columns = myInterpolator.vel_columns
+
+    keyPoints = [[] for x in range(dof_vel)]
+    lastVelCounter = np.zeros((dof_vel))
+    lastVelDirection = np.zeros((dof_vel))
+
+    counter = np.zeros((dof_vel))
+
+    for i in range(dof_vel):
+        keyPoints[i].append(0)
+        lastVelCounter[i] = trajectoryStates[0, vel_columns[i]]
+
+    for i in range(dof_vel):
+        for j in range(1, myInterpolator.trajecLength):
+            counter[i] += 1
+
+            currentVelDirection = trajectoryStates[j, vel_columns[i]] - trajectoryStates[j-1, vel_columns[i]]
+            currentVelChange = trajectoryStates[j, vel_columns[i]] - lastVelCounter[i]
+
+            if(currentVelChange > velChangeRequired or currentVelChange < -velChangeRequired):
+                keyPoints[i].append(j)
+                lastVelCounter[i] = trajectoryStates[j, vel_columns[i]]
+            else:
+                if(counter[i] >= maxN):
+                    keyPoints[i].append(j)
+                    counter[i] = 0
+                    lastVelCounter[i] = trajectoryStates[j, vel_columns[i]]
+                else:
+                    if(currentVelDirection * lastVelDirection[i] < 0):
+                        if(counter[i] >= minN):
+                            keyPoints[i].append(j)
+                            lastVelCounter[i] = trajectoryStates[j, vel_columns[i]]
+                            counter[i] = 0
+
+            lastVelDirection[i] = currentVelDirection
+
+    for i in range(dof_vel):
+        if(keyPoints[i][-1] != myInterpolator.trajecLength - 1):
+            keyPoints[i].append(myInterpolator.trajecLength - 1)
+
+    return keyPoints
+
+def keyPoints_adaptiveThreshold_reference(myInterpolator, profile, startIndex, minN, maxN, threshold):
+    keyPoints = [[] for x in range(myInterpolator.dof_vel)]
+
+    for i in range(myInterpolator.dof_vel):
+        keyPoints[i].append(0)
+
+    counterSinceLastEval = np.zeros((myInterpolator.dof_vel))
+
+    for i in range(myInterpolator.dof_vel):
+        for j in range(startIndex, len(profile)):
+
+            if(counterSinceLastEval[i] >= minN):
+                if(profile[j, i] > threshold or profile[j, i] < -threshold):
+                    keyPoints[i].append(j)
+                    counterSinceLastEval[i] = 0
+
+            if(counterSinceLastEval[i] >= maxN):
+                keyPoints[i].append(j)
+                counterSinceLastEval[i] = 0
+
+            counterSinceLastEval[i] = counterSinceLastEval[i] + 1
+
+    for i in range(myInterpolator.dof_vel):
+        keyPoints[i].append(myInterpolator.trajecLength - 1)
+
+    return keyPoints
+
+def keyPoints_adaptiveJerk_reference(myInterpolator, dynParameters):
+    jerkProfile = calcJerkOverTrajectory_reference(myInterpolator, myInterpolator.states)
+
+    return keyPoints_adaptiveThreshold_reference(myInterpolator, jerkProfile, 1, dynParameters.minN, dynParameters.maxN, dynParameters.jerkThreshold)
+
+def keyPoints_adaptiveAccel_reference(myInterpolator, dynParameters):
+    accelProfile = calculateAccellerationOverTrajectory_reference(myInterpolator, myInterpolator.states)
+
+    return keyPoints_adaptiveThreshold_reference(myInterpolator, accelProfile, 0, dynParameters.minN, dynParameters.maxN, dynParameters.acellThreshold)
+
+def keyPoints_iteratively_reference(myInterpolator, dynParameters):
+    A_matrices = myInterpolator.A_matrices
+    keyPoints = [[] for x in range(myInterpolator.dof_vel)]
+    for i in range(myInterpolator.dof_vel):
+        keyPoints[i].append(0)
+
+    minN = dynParameters.minN
+    iter_error_thresh = dynParameters.iterative_error_threshold
+
+    for i in range(myInterpolator.dof_vel):
+        binComplete = False
+        listofIndicesCheck = [(0, myInterpolator.trajecLength - 1)]
+        subListIndices = []
+        subListWithMidpoints = []
+
+        while(not binComplete):
+
+            allChecksComplete = True
+            for j in range(len(listofIndicesCheck)):
+
+                approximationGood, midIndex = myInterpolator.oneCheck(A_matrices, listofIndicesCheck[j], i, minN, iter_error_thresh)
+
+                if not approximationGood:
+                    allChecksComplete = False
+                    subListIndices.append((listofIndicesCheck[j][0], midIndex))
+                    subListIndices.append((midIndex, listofIndicesCheck[j][1]))
+                else:
+                    subListWithMidpoints.append(listofIndicesCheck[j][0])
+                    subListWithMidpoints.append(midIndex)
+                    subListWithMidpoints.append(listofIndicesCheck[j][1])
+
+            if(allChecksComplete):
+                binComplete = True
+                for k in range(len(subListWithMidpoints)):
+                    keyPoints[i].append(subListWithMidpoints[k])
+
+                subListWithMidpoints = []
+
+            listofIndicesCheck = subListIndices.copy()
+            subListIndices = []
+
+    for i in range(myInterpolator.dof_vel):
+        keyPoints[i].sort()
+        keyPoints[i] = list(dict.fromkeys(keyPoints[i]))
+
+    return keyPoints
+
+def midpointErrors_reference(myInterpolator, A_matrices, startIndices, endIndices, dofNums):
+    # Midpoint errors from the full (S, n, n) interpolated and true matrices, before gathering the scored columns
+    startVals = A_matrices[startIndices]
+    diff = A_matrices[endIndices] - startVals
+    sq_diff = (A_matrices[(startIndices + endIndices) // 2] - (startVals + (diff/2))) ** 2
+
+    segmentIndices = np.arange(len(dofNums))
+    sum_sq_diff = 0 + sq_diff[segmentIndices, :, myInterpolator.pos_columns[dofNums]].sum(axis=1)
+    sum_sq_diff = sum_sq_diff + sq_diff[segmentIndices, :, myInterpolator.vel_columns[dofNums]].sum(axis=1)
+
+    return sum_sq_diff / (2 * myInterpolator.dof_vel)
+
+def generateLinInterpolation_reference(myInterpolator, A_matrices, B_matrices, reEvaluationIndicies, key_points_w):
+    A_linInterpolationData = np.zeros((myInterpolator.trajecLength, myInterpolator.num_states, myInterpolator.num_states), dtype=myInterpolator.dtype)
+    B_linInterpolationData = np.zeros((myInterpolator.trajecLength, myInterpolator.num_states, myInterpolator.num_ctrl), dtype=myInterpolator.dtype)
+
+    for i in range(myInterpolator.dof_vel):
+        pos_column = myInterpolator.pos_columns[i]
+        vel_column = myInterpolator.vel_columns[i]
+        for j in range(len(reEvaluationIndicies[i]) - 1):
+            start_index = reEvaluationIndicies[i][j]
+            end_index = reEvaluationIndicies[i][j + 1]
+
+            startVals_pos = A_matrices[start_index, :, pos_column]
+            startVals_vel = A_matrices[start_index, :, vel_column]
+            endVals_pos = A_matrices[end_index, :, pos_column]
+            endVals_vel = A_matrices[end_index, :, vel_column]
+            if(i < myInterpolator.num_ctrl):
+                startVals_B = B_matrices[start_index, :, i]
+                endVals_B = B_matrices[end_index, :, i]
+                diff_B = endVals_B - startVals_B
+
+            interval = end_index - start_index
+            diff_pos = endVals_pos - startVals_pos
+            diff_vel = endVals_vel - startVals_vel
+
+            for k in range(interval):
+                A_linInterpolationData[start_index + k, :, pos_column] = startVals_pos + (diff_pos * (k / interval))
+                A_linInterpolationData[start_index + k, :, vel_column] = startVals_vel + (diff_vel * (k / interval))
+
+                if(i < myInterpolator.num_ctrl):
+                    B_linInterpolationData[start_index + k, :, i] = startVals_B + (diff_B * (k / interval))
+
+    for i in range(len(myInterpolator.quat_w_indices)):
+        for j in range(len(key_points_w) - 1):
+            start_index = key_points_w[j]
+            end_index = key_points_w[j + 1]
+
+            startVals = A_matrices[start_index, :, myInterpolator.quat_w_indices[i]]
+            endVals = A_matrices[end_index, :, myInterpolator.quat_w_indices[i]]
+
+            diff = endVals - startVals
+            interval = end_index - start_index
+
+            A_linInterpolationData[start_index, :, myInterpolator.quat_w_indices[i]] = startVals
+
+            for k in range(1, interval):
+                A_linInterpolationData[start_index + k, :, myInterpolator.quat_w_indices[i]] = startVals + (diff * (k / interval))
+
+    A_linInterpolationData[len(A_linInterpolationData) - 1,:] = A_linInterpolationData[len(A_linInterpolationData) - 2,:]
+
+    return A_linInterpolationData, B_linInterpolationData
+
+# ------------------------------------------- Checks ------------------------------------------------
+
+def compareWithReference(method, referenceMethod, arguments, times):
+    '''
+    Call a method and its reference implementation with the same arguments, adding the time each
+    took to times[0] and times[1]. Returns both results.
+
+    '''
+    startTime = time.time()
+    result = method(*arguments)
+    times[0] += time.time() - startTime
+
+    startTime = time.time()
+    result_reference = referenceMethod(*arguments)
+    times[1] += time.time() - startTime
+
+    return result, result_reference
+
+def loadKeypointSweep(task, trajecNumber, dynParams, dtype = np.float64):
+    '''
+    Preload a trajectory and generate the keypoints of every parameter set. Returns the interpolator
+    and the keypoints.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True, dtype=dtype)
+    keyPoints = myInterpolator.generateKeypoints(myInterpolator.A_matrices, myInterpolator.B_matrices, myInterpolator.states.copy(),
+                                                 myInterpolator.controls.copy(), dynParams)
+
+    return myInterpolator, keyPoints
+
+def quaternionKeyPoints(myInterpolator):
+    '''
+    Quaternion w keypoints with a repeated and adjacent keypoints. The bundled tasks have no
+    quaternion, so for those the last state column is treated as a quaternion w column.
+
+    '''
+    if(len(myInterpolator.quat_w_indices) == 0):
+        myInterpolator.quat_w_indices = np.array([myInterpolator.num_states - 1])
+
+    return np.array([0, 3, 3, 40, 41, 500, myInterpolator.trajecLength - 1])
+
+def check_matrix_unpacking(task, trajecNumber):
+    myInterpolator = interpolator(task, trajecNumber)
+
+    A_reference = unpackMatrices_reference(myInterpolator.A_matrices_load, myInterpolator.num_states, myInterpolator.num_states)
+    B_reference = unpackMatrices_reference(myInterpolator.B_matrices_load, myInterpolator.num_states, myInterpolator.num_ctrl)
+
+    assert myInterpolator.A_matrices.shape == A_reference.shape
+    assert myInterpolator.B_matrices.shape == B_reference.shape
+    assert np.array_equal(myInterpolator.A_matrices, A_reference), "A matrices differ from reference unpacking"
+    assert np.array_equal(myInterpolator.B_matrices, B_reference), "B matrices differ from reference unpacking"
+
+    # The unpacked tensors should be views onto the loaded data, not copies
+    assert np.shares_memory(myInterpolator.A_matrices, myInterpolator.A_matrices_load)
+    assert np.shares_memory(myInterpolator.B_matrices, myInterpolator.B_matrices_load)
+
+def makeScratchTask(task, trajecNumbers):
+    '''
+    Copy the meta data and csv files of some trajectories of a task into a scratch task that the
+    checks can modify, remove it with shutil.rmtree(taskPath(scratchTask)). Returns its name.
+
+    '''
+    scratchTask = "regression_scratch_" + task
+    shutil.rmtree(taskPath(scratchTask), ignore_errors=True)
+    os.makedirs(taskPath(scratchTask))
+    shutil.copy(taskPath(task) + "/" + META_DATA_FILE, taskPath(scratchTask) + "/" + META_DATA_FILE)
+    for trajecNumber in trajecNumbers:
+        os.makedirs(trajecPath(scratchTask, trajecNumber))
+        for component in TRAJEC_COMPONENTS:
+            shutil.copy(trajecPath(task, trajecNumber) + "/" + component + ".csv", trajecPath(scratchTask, trajecNumber) + "/" + component + ".csv")
+
+    return scratchTask
+
+def rewriteCSV(task, trajecNumber, component, transform):
+    # Rewrite a csv file with transform applied to its lines, changing its size or modification time
+    path = trajecPath(task, trajecNumber) + "/" + component + ".csv"
+    with open(path, 'r') as file:
+        lines = file.read().splitlines(keepends=True)
+    stat = os.stat(path)
+    with open(path, 'w') as file:
+        file.write("".join(transform(lines)))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+def check_trajec_cache(task):
+    '''
+    Check the binary cache is used while it is up to date, and that changing a csv file invalidates
+    only that component, which is then parsed from the csv until the cache is rebuilt.
+
+    '''
+    scratchTask = makeScratchTask(task, [0])
+    try:
+        assert not any(cacheValid(scratchTask, 0, component) for component in TRAJEC_COMPONENTS)
+        assert buildTrajecCache(scratchTask) == len(TRAJEC_COMPONENTS)
+        assert buildTrajecCache(scratchTask) == 0
+        assert all(cacheValid(scratchTask, 0, component) for component in TRAJEC_COMPONENTS)
+
+        # Same size, new modification time and contents
+        rewriteCSV(scratchTask, 0, "states", lambda lines: [lines[1]] + lines[1:])
+        assert not cacheValid(scratchTask, 0, "states")
+        assert all(cacheValid(scratchTask, 0, component) for component in TRAJEC_COMPONENTS if component != "states")
+        states = loadTrajecComponent(scratchTask, 0, "states")
+        assert np.array_equal(states, readTrajecCSV(scratchTask, 0, "states")) and np.array_equal(states[0], states[1])
+
+        assert buildTrajecCache(scratchTask) == 1
+        assert np.array_equal(np.load(cachePath(scratchTask, 0) + "/states.npy"), states)
+        assert np.array_equal(interpolator(scratchTask, 0).states, states)
+    finally:
+        shutil.rmtree(taskPath(scratchTask), ignore_errors=True)
+
+def check_lazy_loading(task, trajecNumber):
+    '''
+    Check an interpolator reads no trajectory component until it is used, then loads only that
+    component, and ends up with the same arrays as a preloaded one.
+
+    '''
+    preloaded = interpolator(task, trajecNumber, preload=True)
+    lazy = interpolator(task, trajecNumber)
+    assert not any(name in lazy.__dict__ for name in interpolator.LAZY_ATTRIBUTES), "components loaded before use"
+    assert lazy.trajecLength == preloaded.trajecLength and lazy.num_ctrl == preloaded.num_ctrl
+
+    assert np.array_equal(lazy.states, preloaded.states)
+    assert "states" in lazy.__dict__ and not any(name in lazy.__dict__ for name in ["A_matrices", "B_matrices", "controls"])
+
+    for name in interpolator.LAZY_ATTRIBUTES:
+        assert np.array_equal(getattr(lazy, name), getattr(preloaded, name)), name + " differs when lazily loaded"
+
+    try:
+        lazy.notAnAttribute
+        assert False, "unknown attribute did not raise"
+    except AttributeError:
+        pass
+
+class countingExecutor(ProcessPoolExecutor):
+    # Process pool that counts the trajectories submitted to it, to check loadInterpolators' in flight bound
+    numSubmitted = 0
+
+    def submit(self, *args, **kwargs):
+        countingExecutor.numSubmitted += 1
+        return super().submit(*args, **kwargs)
+
+def check_load_interpolators(task, trajecNumbers, numWorkers, maxInFlight):
+    '''
+    Check loadInterpolators yields the trajectories in the order asked for, equal to loading them one
+    by one, with never more than maxInFlight submitted but not yet consumed.
+
+    '''
+    countingExecutor.numSubmitted = 0
+    interpolateDynamics.ProcessPoolExecutor = countingExecutor
+    try:
+        numConsumed = 0
+        for trajecNumber, loaded in zip(trajecNumbers, loadInterpolators(task, trajecNumbers, numWorkers, maxInFlight)):
+            assert countingExecutor.numSubmitted - numConsumed <= maxInFlight, "more than maxInFlight trajectories in flight"
+            numConsumed += 1
+
+            expected = interpolator(task, trajecNumber, preload=True)
+            assert loaded.trajecNumber == trajecNumber, "loadInterpolators yielded trajectories out of order"
+            for component in TRAJEC_COMPONENTS:
+                assert np.array_equal(getattr(loaded, component), getattr(expected, component)), component + " differs when loaded in the pool"
+    finally:
+        interpolateDynamics.ProcessPoolExecutor = ProcessPoolExecutor
+
+    assert numConsumed == len(trajecNumbers)
+
+    arrays = list(loadInterpolators(task, trajecNumbers[0:2], numWorkers, maxInFlight, returnArrays=True))
+    assert np.array_equal(arrays[1]["states"], interpolator(task, trajecNumbers[1], preload=True).states)
+
+def check_windowed_interpolation(task, trajecNumber, dynParams):
+    '''
+    Check readTrajecChunks windows tile the trajectory with the overlap asked for, from the csv, the
+    cache and a dataset, that InterpolateTrajectoryWindowed gives the InterpolateTrajectory keypoints
+    and errors when the window covers the trajectory, and that smaller windows put a keypoint at
+    every window boundary.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    T = myInterpolator.trajecLength
+    dataset = taskDataset(task, validTrajecNumbers(task, range(5)))
+
+    for windowSize, overlap, useCache, chunkDataset in [(300, 1, True, None), (256, 0, False, None), (T + 10, 1, True, None), (400, 37, True, dataset)]:
+        expectedStart = 0
+        for startIndex, components in readTrajecChunks(task, trajecNumber, windowSize, overlap, useCache, chunkDataset):
+            assert startIndex == expectedStart
+            for component in TRAJEC_COMPONENTS:
+                assert np.array_equal(components[component], getattr(myInterpolator, component + "_load" if "matrices" in component else component)[startIndex:startIndex + windowSize])
+            windowLength = len(components["A_matrices"])
+            expectedStart += windowSize - overlap
+        assert startIndex + windowLength == T, "windows don't reach the end of the trajectory"
+
+    _, _, _, errors, keyPoints, key_points_w = myInterpolator.InterpolateTrajectory(0, dynParams)
+    for windowSize in [T, T + 100]:
+        windowedErrors, windowedKeyPoints, windowedKeyPoints_w = myInterpolator.InterpolateTrajectoryWindowed(dynParams, windowSize)
+        assert windowedKeyPoints == [[list(map(int, dofKeyPoints)) for dofKeyPoints in parameterKeyPoints] for parameterKeyPoints in keyPoints]
+        assert np.allclose(windowedErrors, errors, rtol=1e-12, atol=0), "windowed errors differ from InterpolateTrajectory"
+
+    windowSize = 300
+    windowedErrors, windowedKeyPoints, windowedKeyPoints_w = myInterpolator.InterpolateTrajectoryWindowed(dynParams, windowSize)
+    for parameterKeyPoints in windowedKeyPoints:
+        for dofKeyPoints in parameterKeyPoints:
+            assert set(range(0, T, windowSize - 1)) <= set(dofKeyPoints) and dofKeyPoints[-1] == T - 1
+            assert dofKeyPoints == sorted(set(dofKeyPoints))
+
+def check_trajec_manifest(task):
+    '''
+    Check the manifest marks truncated, ragged, empty valued and length mismatched trajectories as
+    invalid, that loading them raises and that sweeps skip them with a warning, that it records the
+    dtype the values parse to, and that fixing a file is picked up.
+
+    '''
+    scratchTask = makeScratchTask(task, range(5))
+    try:
+        # Cut off part way through the last row, after one of its commas
+        rewriteCSV(scratchTask, 1, "A_matrices", lambda lines: lines[:-1] + [lines[-1][0:lines[-1].rindex(",") + 1]])
+        rewriteCSV(scratchTask, 2, "states", lambda lines: lines[:10] + [lines[10].replace(",", ",0.5,", 1)] + lines[11:])
+        rewriteCSV(scratchTask, 3, "controls", lambda lines: lines[:-5])
+        rewriteCSV(scratchTask, 4, "B_matrices", lambda lines: lines[:3] + [lines[3][lines[3].index(","):]] + lines[4:])
+        # Still valid, with values that parse as integers
+        rewriteCSV(scratchTask, 0, "controls", lambda lines: ["1,\n"] * len(lines))
+
+        manifest = buildTaskManifest(scratchTask)
+        problems = {trajecNumber: entry['problem'] for trajecNumber, entry in manifest['trajectories'].items()}
+        assert manifest['trajectories']['0']['valid']
+        assert "truncated" in problems['1'], problems['1']
+        assert "columns" in problems['2'], problems['2']
+        assert "rows" in problems['3'], problems['3']
+        assert "empty" in problems['4'], problems['4']
+        assert manifest['trajectories']['0']['components']['controls']['dtype'] == "int64"
+        assert manifest['trajectories']['0']['components']['states']['dtype'] == "float64"
+        assert np.array_equal(interpolator(scratchTask, 0).controls, np.ones((manifest['trajectories']['0']['components']['controls']['rows'], 1)))
+
+        for trajecNumber in range(1, 5):
+            try:
+                interpolator(scratchTask, trajecNumber)
+                assert False, "invalid trajectory " + str(trajecNumber) + " loaded"
+            except ValueError:
+                pass
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            assert validTrajecNumbers(scratchTask) == [0]
+        assert len(caught) == 4, [str(warning.message) for warning in caught]
+
+        # Restoring the file makes the trajectory valid again
+        shutil.copy(trajecPath(task, 3) + "/controls.csv", trajecPath(scratchTask, 3) + "/controls.csv")
+        buildTaskManifest(scratchTask)
+        assert validTrajecNumbers(scratchTask) == [0, 3]
+        assert np.array_equal(interpolator(scratchTask, 3).controls, interpolator(task, 3).controls)
+    finally:
+        shutil.rmtree(taskPath(scratchTask), ignore_errors=True)
+
+def check_task_dataset(task):
+    '''
+    Check a task has a single stacked store that datasets of different trajectory sets index into,
+    built from the csv files without writing the per-trajectory cache, that growing it leaves
+    datasets still memory-mapping the old files unaffected and removes stale stacked files, and that
+    an interpolator reading from a dataset sees the same trajectory as one reading the csv files.
+
+    '''
+    trajecNumbers = validTrajecNumbers(task, range(5))
+    scratchTask = makeScratchTask(task, trajecNumbers)
+    try:
+        os.makedirs(datasetPath(scratchTask) + "/dataset_0123456789abcdef")
+        subset = taskDataset(scratchTask, trajecNumbers[1:4])
+        assert not os.path.exists(datasetPath(scratchTask) + "/dataset_0123456789abcdef"), "stale dataset folder not removed"
+        for trajecNumber in trajecNumbers:
+            assert not os.path.exists(cachePath(scratchTask, trajecNumber)), "per-trajectory cache written"
+
+        dataset = taskDataset(scratchTask, trajecNumbers)
+        assert not buildTaskDataset(scratchTask, trajecNumbers[0:2]), "store rewritten for trajectories it holds"
+        assert sorted(os.listdir(datasetPath(scratchTask))) == sorted([component + ".npy" for component in TRAJEC_COMPONENTS] + [DATASET_KEY_FILE])
+
+        for trajecNumber in trajecNumbers:
+            for component in TRAJEC_COMPONENTS:
+                expected = readTrajecCSV(task, trajecNumber, component)
+                assert np.array_equal(dataset.trajecComponent(trajecNumber, component), expected), "stacked " + component + " differs from csv"
+                if trajecNumber in subset.trajecIndex:
+                    assert np.array_equal(subset.trajecComponent(trajecNumber, component), expected), "stacked " + component + " differs from csv"
+
+        # A changed csv file is parsed again, the other trajectories are copied from the old store
+        rewriteCSV(scratchTask, trajecNumbers[2], "states", lambda lines: lines[::-1])
+        changed = taskDataset(scratchTask, trajecNumbers)
+        assert np.array_equal(changed.trajecComponent(trajecNumbers[2], "states"), readTrajecCSV(scratchTask, trajecNumbers[2], "states")[0:changed.trajecLengths[changed.trajecIndex[trajecNumbers[2]]]])
+        assert np.array_equal(changed.trajecComponent(trajecNumbers[4], "A_matrices"), readTrajecCSV(task, trajecNumbers[4], "A_matrices"))
+        assert np.array_equal(subset.trajecComponent(trajecNumbers[2], "states"), readTrajecCSV(task, trajecNumbers[2], "states"))
+    finally:
+        shutil.rmtree(taskPath(scratchTask), ignore_errors=True)
+
+    dataset = taskDataset(task, trajecNumbers)
+    datasetInterpolator = interpolator(task, trajecNumbers[1], dataset=dataset)
+    csvInterpolator = interpolator(task, trajecNumbers[1], useCache=False)
+    assert np.array_equal(datasetInterpolator.A_matrices, csvInterpolator.A_matrices)
+
+def check_sparse_matrices(task, trajecNumber, dynParams):
+    '''
+    None of the bundled trajectories has constant entries, so reload the A and B matrices with synthetic
+    constant blocks (identity, zero and dt like entries) and check the split form against the dense
+    matrices and InterpolateTrajectory, including keypoints that don't cover the whole trajectory.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    n = myInterpolator.num_states
+    T = myInterpolator.trajecLength
+
+    # Built before the reload, must not be reused after it. Every entry of the bundled matrices
+    # changes over the trajectory, so the time-varying entries are the dense data itself
+    assert np.shares_memory(myInterpolator.A_sparse.values, myInterpolator.A_matrices), "sparse A matrices copy the dense ones"
+    assert np.shares_memory(myInterpolator.B_sparse.values, myInterpolator.B_matrices), "sparse B matrices copy the dense ones"
+
+    A_flat = myInterpolator.A_matrices_load.copy()
+    B_flat = myInterpolator.B_matrices_load.copy()
+    A_flat[:, 0] = 1.0
+    A_flat[:, 1] = 0.0
+    A_flat[:, n + 1] = 1.0
+    A_flat[:, n + myInterpolator.dof_pos] = 0.005
+    B_flat[:, 0] = 0.0
+    B_flat[:, -1] = -2.0
+    myInterpolator.loadComponent("A_matrices", A_flat)
+    myInterpolator.loadComponent("B_matrices", B_flat)
+
+    assert np.array_equal(myInterpolator.A_sparse.toDense(), myInterpolator.A_matrices), "sparse A matrices differ from dense"
+    assert np.array_equal(myInterpolator.B_sparse.toDense(), myInterpolator.B_matrices), "sparse B matrices differ from dense"
+    assert len(myInterpolator.A_sparse.constantIndices) >= 4
+
+    errors = myInterpolator.InterpolateTrajectorySparse(dynParams)[0]
+    referenceErrors = myInterpolator.InterpolateTrajectory(0, dynParams)[3]
+    assert np.allclose(errors, referenceErrors, rtol=1e-12, atol=0), "sparse errors differ from InterpolateTrajectory"
+
+    # Keypoints that start late and end early leave the ends of every column at zero
+    keyPoints = [[5, 40, 41, 300, T - 20] for x in range(myInterpolator.dof_vel)]
+    key_points_w = myInterpolator.keyPoints_quaternion_w()
+    A_interpolation, B_interpolation = myInterpolator.generateLinInterpolation(myInterpolator.A_matrices, myInterpolator.B_matrices, keyPoints, key_points_w)
+    referenceError = myInterpolator.calcErrorOverTrajectory(myInterpolator.A_matrices, A_interpolation)
+    referenceError += myInterpolator.calcErrorOverTrajectory(myInterpolator.B_matrices, B_interpolation)
+    A_sparseInterpolation = myInterpolator.generateSparseLinInterpolation(myInterpolator.A_sparse, "A", keyPoints, key_points_w)
+    B_sparseInterpolation = myInterpolator.generateSparseLinInterpolation(myInterpolator.B_sparse, "B", keyPoints, key_points_w)
+    error = myInterpolator.calcErrorOverTrajectorySparse(myInterpolator.A_sparse, "A", A_sparseInterpolation, keyPoints, key_points_w)
+    error += myInterpolator.calcErrorOverTrajectorySparse(myInterpolator.B_sparse, "B", B_sparseInterpolation, keyPoints, key_points_w)
+    assert np.isclose(error, referenceError, rtol=1e-12, atol=0), "sparse error with partial keypoints differs"
+
+def check_derived_signals(task, trajecNumber, numCalls):
+    '''
+    Check the cached jerk / accel profiles are bit for bit the reference profiles, also after the
+    states are reloaded, returns the time taken by numCalls profile requests with the cache and with
+    the reference loops
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    times = [0, 0]
+
+    for i in range(numCalls):
+        jerkProfile, jerkProfile_reference = compareWithReference(myInterpolator.calcJerkOverTrajectory, lambda states: calcJerkOverTrajectory_reference(myInterpolator, states),
+                                                                  (myInterpolator.states,), times)
+        accelProfile, accelProfile_reference = compareWithReference(myInterpolator.calculateAccellerationOverTrajectory,
+                                                                    lambda states: calculateAccellerationOverTrajectory_reference(myInterpolator, states),
+                                                                    (myInterpolator.states,), times)
+
+    assert np.array_equal(jerkProfile, jerkProfile_reference), "jerk profile differs from reference"
+    assert np.array_equal(accelProfile, accelProfile_reference), "accel profile differs from reference"
+
+    # Profiles of states other than self.states are computed fresh, not taken from the cache
+    otherStates = myInterpolator.states * 2
+    assert np.array_equal(myInterpolator.calcJerkOverTrajectory(otherStates), calcJerkOverTrajectory_reference(myInterpolator, otherStates))
+
+    # Reloading the states clears the cache
+    myInterpolator.loadComponent("states", otherStates)
+    assert np.array_equal(myInterpolator.calculateAccellerationOverTrajectory(myInterpolator.states), calculateAccellerationOverTrajectory_reference(myInterpolator, otherStates))
+
+    return times[0], times[1]
+
+# Keypoint methods called the same way as their references
+def adaptiveJerkKeyPoints(myInterpolator, dynParameters):
+    return myInterpolator.keyPoints_adaptiveJerk(myInterpolator.states, dynParameters)
+
+def adaptiveAccelKeyPoints(myInterpolator, dynParameters):
+    return myInterpolator.keyPoints_adaptiveAccel(myInterpolator.states, dynParameters)
+
+def magVelChangeKeyPoints(myInterpolator, dynParameters):
+    return myInterpolator.keyPoints_magVelChange(myInterpolator.states, myInterpolator.controls, dynParameters)
+
+def iterativeKeyPoints(myInterpolator, dynParameters):
+    return myInterpolator.keyPoints_iteratively(myInterpolator.A_matrices, dynParameters)
+
+def check_keyPoints(task, trajecNumber, method, referenceMethod, dynParams):
+    '''
+    Check a keypoint method gives identical keypoints to its reference implementation for every
+    parameter set, returns the time taken by the method and by the reference
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    times = [0, 0]
+
+    for dynParameters in dynParams:
+        keyPoints, keyPoints_reference = compareWithReference(method, referenceMethod, (myInterpolator, dynParameters), times)
+        assert keyPoints == keyPoints_reference, dynParameters.keyPoint_method + " keypoints differ from reference for " + str(dynParameters)
+
+    return times[0], times[1]
+
+def check_adaptiveThreshold(task, trajecNumber, dynParams):
+    '''
+    Check the adaptive threshold state machine against the reference on precomputed jerk / accel
+    profiles, returns the time taken by the state machine and by the reference
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    jerkProfile = myInterpolator.calcJerkOverTrajectory(myInterpolator.states)
+    accelProfile = myInterpolator.calculateAccellerationOverTrajectory(myInterpolator.states)
+    times = [0, 0]
+
+    for dynParameters in dynParams:
+        if(dynParameters.keyPoint_method == "adaptiveJerk"):
+            profile, startIndex, threshold = jerkProfile, 1, dynParameters.jerkThreshold
+        else:
+            profile, startIndex, threshold = accelProfile, 0, dynParameters.acellThreshold
+
+        keyPoints, keyPoints_reference = compareWithReference(
+            myInterpolator.keyPoints_adaptiveThreshold,
+            lambda profile, startIndex, dynParameters, threshold: keyPoints_adaptiveThreshold_reference(myInterpolator, profile, startIndex, dynParameters.minN, dynParameters.maxN, threshold),
+            (profile, startIndex, dynParameters, threshold), times)
+        assert keyPoints == keyPoints_reference, dynParameters.keyPoint_method + " keypoints differ from reference for " + str(dynParameters)
+
+    return times[0], times[1]
+
+def check_midpoint_errors(task, trajecNumber, numSegments):
+    '''
+    Check midpointErrors gives the same errors as midpointError on random segments of every dof, and
+    at given check indices the same as interpolating the segment there (midpoints are still scored as
+    midpoints). Returns the time taken by midpointErrors and by scoring the full matrices.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    A_matrices = myInterpolator.A_matrices
+    generator = np.random.default_rng(trajecNumber)
+    startIndices = generator.integers(0, myInterpolator.trajecLength - 2, numSegments)
+    endIndices = np.minimum(startIndices + generator.integers(2, 200, numSegments), myInterpolator.trajecLength - 1)
+    dofNums = generator.integers(0, myInterpolator.dof_vel, numSegments)
+    times = [0, 0]
+
+    errors, referenceErrors = compareWithReference(myInterpolator.midpointErrors, lambda *arguments: midpointErrors_reference(myInterpolator, *arguments),
+                                                   (A_matrices, startIndices, endIndices, dofNums), times)
+
+    assert np.array_equal(errors, referenceErrors), "midpointErrors differ from scoring the full matrices"
+    for j in range(0, numSegments, max(1, numSegments // 100)):
+        assert errors[j] == myInterpolator.midpointError(A_matrices, (startIndices[j], endIndices[j]), dofNums[j])
+
+    checkIndices = startIndices + 1
+    checkErrors = myInterpolator.midpointErrors(A_matrices, startIndices, endIndices, dofNums, checkIndices)
+    for j in range(0, numSegments, max(1, numSegments // 100)):
+        fraction = 0.5 if checkIndices[j] == (startIndices[j] + endIndices[j]) // 2 else (checkIndices[j] - startIndices[j]) / (endIndices[j] - startIndices[j])
+        interpolation = A_matrices[startIndices[j]] + (A_matrices[endIndices[j]] - A_matrices[startIndices[j]]) * fraction
+        assert np.isclose(checkErrors[j], myInterpolator.meansqDiffBetweenAMatrices(A_matrices[checkIndices[j]], interpolation, dofNums[j]), rtol=1e-12, atol=0)
+
+    return times[0], times[1]
+
+def check_iterativePriority(task, trajecNumber, dynParams, keyPointBudgets):
+    '''
+    Check the priority queue iterativeError search gives the breadth first keypoints when it has no
+    budget, and stays within budget (splitting a subset of the same segments) when it does. Returns
+    the time taken by the priority queue and breadth first searches without a budget.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    times = [0, 0]
+
+    for dynParameters in dynParams:
+        priorityParameters = derivative_interpolator("iterativeErrorPriority", dynParameters.minN, dynParameters.maxN, 0, 0, dynParameters.iterative_error_threshold, 0)
+
+        keyPoints, keyPoints_reference = compareWithReference(lambda A_matrices: myInterpolator.keyPoints_iterativelyPrioritised(A_matrices, priorityParameters),
+                                                              lambda A_matrices: myInterpolator.keyPoints_iteratively(A_matrices, dynParameters),
+                                                              (myInterpolator.A_matrices,), times)
+        assert keyPoints == keyPoints_reference, "iterativeErrorPriority keypoints differ from iterativeError for " + str(dynParameters)
+
+        for keyPointBudget in keyPointBudgets:
+            priorityParameters.keyPoint_budget = keyPointBudget
+            budgetKeyPoints = myInterpolator.keyPoints_iterativelyPrioritised(myInterpolator.A_matrices, priorityParameters)
+
+            assert sum(len(dofKeyPoints) for dofKeyPoints in budgetKeyPoints) <= keyPointBudget, "iterativeErrorPriority keypoints over budget"
+            for i in range(myInterpolator.dof_vel):
+                assert set(budgetKeyPoints[i]) <= set(keyPoints[i]), "iterativeErrorPriority split a segment the unlimited search did not"
+
+    # A budget that can't hold the endpoints of every dof is clamped to them
+    for keyPointBudget in [0, 2 * myInterpolator.dof_vel - 1, 2 * myInterpolator.dof_vel]:
+        priorityParameters.keyPoint_budget = keyPointBudget
+        endpointKeyPoints = myInterpolator.keyPoints_iterativelyPrioritised(myInterpolator.A_matrices, priorityParameters)
+        assert endpointKeyPoints == [[0, myInterpolator.trajecLength - 1]] * myInterpolator.dof_vel
+
+    return times[0], times[1]
+
+def check_keypoint_registry(task, trajecNumber):
+    '''
+    Check generateKeypoints gives the same keypoints sequentially and in parallel, runs a newly
+    registered method, and rejects unknown methods
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    set_interval_methods, jerk_methods, vel_methods, iter_error_methods = return_interpolation_settings("acrobot")
+    dynParams = jerk_methods + vel_methods + iter_error_methods + set_interval_methods + [derivative_interpolator("adaptiveAccel", 5, 20, 0.001, 0, 0, 0)]
+    arguments = (myInterpolator.A_matrices, myInterpolator.B_matrices, myInterpolator.states, myInterpolator.controls)
+
+    keyPoints = myInterpolator.generateKeypoints(*arguments, dynParams)
+    keyPoints_parallel = myInterpolator.generateKeypoints(*arguments, dynParams, numWorkers=4)
+    assert keyPoints == keyPoints_parallel, "parallel keypoint generation differs from sequential"
+
+    for dynParameters, methodKeyPoints in zip(dynParams, keyPoints):
+        assert methodKeyPoints == myInterpolator.generateKeypoints(*arguments, [dynParameters])[0]
+
+    @registerKeypointMethod("regressionCheckEndpoints", ("states",))
+    def keypointMethod_endpoints(myInterpolator, signals, dynParameters):
+        return [[0, len(signals["states"]) - 1] for i in range(myInterpolator.dof_vel)]
+
+    endpointParameters = derivative_interpolator("regressionCheckEndpoints", 0, 0, 0, 0, 0, 0)
+    endpointKeyPoints = myInterpolator.generateKeypoints(*arguments, [endpointParameters])[0]
+    assert endpointKeyPoints == [[0, myInterpolator.trajecLength - 1]] * myInterpolator.dof_vel
+    del keypointMethods["regressionCheckEndpoints"]
+
+    try:
+        myInterpolator.generateKeypoints(*arguments, [derivative_interpolator("notAMethod", 0, 0, 0, 0, 0, 0)])
+        assert False, "unknown keypoint method was not rejected"
+    except ValueError:
+        pass
+
+def check_online_keyPoints(task, trajecNumber, dynParams, dtype = np.float64):
+    '''
+    Check streaming the states one at a time through an onlineKeypointDetector places the same
+    keypoints as the offline method, and that the per step decisions match those keypoints. Returns
+    the mean time per addState call.
+
+    '''
+    myInterpolator, offlineKeyPoints = loadKeypointSweep(task, trajecNumber, dynParams, dtype)
+    stepTime = 0
+
+    for dynParameters, keyPoints_reference in zip(dynParams, offlineKeyPoints):
+        detector = onlineKeypointDetector(myInterpolator.dof_pos, myInterpolator.dof_vel, dynParameters)
+        decisions = [[] for x in range(myInterpolator.dof_vel)]
+
+        startTime = time.time()
+        for t in range(myInterpolator.trajecLength):
+            decisionTimestep, evaluate = detector.addState(myInterpolator.states[t])
+            for i in np.flatnonzero(evaluate):
+                decisions[i].append(decisionTimestep)
+        stepTime += (time.time() - startTime) / myInterpolator.trajecLength
+
+        keyPoints = detector.finish()
+        assert keyPoints == keyPoints_reference, "online " + dynParameters.keyPoint_method + " keypoints differ from offline for " + str(dynParameters)
+        for i in range(myInterpolator.dof_vel):
+            # Every keypoint apart from the final timestep added by finish is a decision
+            assert set(decisions[i]) | set([myInterpolator.trajecLength - 1]) == set(keyPoints[i]), "online decisions differ from keypoints"
+
+    return stepTime / len(dynParams)
+
+def horizon_interpolation_error(myInterpolator, A_matrices, keyPoints):
+    # Mean absolute error of linearly interpolating each dof's position and velocity columns between its keypoints
+    timesteps = np.arange(len(A_matrices))
+    errors = []
+    for i in range(myInterpolator.dof_vel):
+        for column in [myInterpolator.pos_columns[i], myInterpolator.vel_columns[i]]:
+            for row in range(myInterpolator.num_states):
+                values = A_matrices[:, row, column]
+                errors.append(np.mean(np.abs(values - np.interp(timesteps, keyPoints[i], values[keyPoints[i]]))))
+
+    return np.mean(errors)
+
+def segmentsWithinThreshold(myInterpolator, A_matrices, keyPoints, dynParameters):
+    '''
+    Whether every segment between consecutive keypoints passes the iterativeError check: it is no longer
+    than minN, its midpoint error is below the threshold, or it is half of a segment whose midpoint
+    error is below the threshold (bisection keeps the start, midpoint and end of the segments it accepts).
+
+    '''
+    minN = dynParameters.minN
+    iter_error_thresh = dynParameters.iterative_error_threshold
+
+    for i in range(myInterpolator.dof_vel):
+        dofKeyPoints = np.array(keyPoints[i])
+        starts, ends = dofKeyPoints[:-1], dofKeyPoints[1:]
+        dofNums = np.full(len(starts), i)
+        passed = ((ends - starts) <= minN) | (myInterpolator.midpointErrors(A_matrices, starts, ends, dofNums) < iter_error_thresh)
+
+        # Pairs of consecutive segments whose shared keypoint is the midpoint of their union
+        if(len(starts) > 1):
+            unionStarts, unionEnds = starts[:-1], ends[1:]
+            unionPassed = ((unionStarts + unionEnds) // 2 == ends[:-1]) & (myInterpolator.midpointErrors(A_matrices, unionStarts, unionEnds, dofNums[1:]) < iter_error_thresh)
+            passed[:-1] |= unionPassed
+            passed[1:] |= unionPassed
+
+        if not passed.all():
+            return False
+
+    return True
+
+def check_warm_start(task, trajecNumber, dynParams, horizonLength, shift):
+    '''
+    Check warm starting from no keypoints is a cold start, that a change to A between kept keypoints is
+    found, then run a receding horizon over the trajectory warm starting every horizon from the last.
+    Every horizon's keypoints must pass the iterativeError check. The warm start must need fewer rounds
+    of midpointErrors than the cold start, and be no slower. Returns the warm and cold start times, mean
+    number of new warm start keypoints, total warm start keypoints and cold start keypoints per horizon,
+    and mean interpolation errors.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    emptyKeyPoints = [[] for x in range(myInterpolator.dof_vel)]
+    warmTime = 0
+    coldTime = 0
+    newKeyPoints = []
+    warmKeyPoints = []
+    coldKeyPoints = []
+    warmErrors = []
+    coldErrors = []
+    horizons = []
+
+    for dynParameters in dynParams:
+        assert myInterpolator.keyPoints_warmStart(myInterpolator.A_matrices, emptyKeyPoints, 0, dynParameters) == myInterpolator.keyPoints_iteratively(myInterpolator.A_matrices, dynParameters)
+
+        # Change A inside the longest kept segment of every dof, the warm start has to split it again
+        A_horizon = myInterpolator.A_matrices[0:horizonLength]
+        previousKeyPoints = myInterpolator.keyPoints_warmStart(A_horizon, emptyKeyPoints, 0, dynParameters)
+        A_changed = A_horizon.copy()
+        changedSegments = []
+        for i in range(myInterpolator.dof_vel):
+            dofKeyPoints = np.array(previousKeyPoints[i][:-1])
+            longest = np.argmax(np.diff(dofKeyPoints))
+            startIndex, endIndex = dofKeyPoints[longest], dofKeyPoints[longest + 1]
+            if(endIndex - startIndex > max(dynParameters.minN, 1)):
+                A_changed[startIndex + 1:endIndex, :, myInterpolator.vel_columns[i]] += 1
+                changedSegments.append((i, startIndex, endIndex))
+        keyPoints = myInterpolator.keyPoints_warmStart(A_changed, previousKeyPoints, 0, dynParameters)
+        assert segmentsWithinThreshold(myInterpolator, A_changed, keyPoints, dynParameters), "warm start kept a segment over the threshold"
+        for i, startIndex, endIndex in changedSegments:
+            assert any(startIndex < keyPoint < endIndex for keyPoint in keyPoints[i]), "warm start missed a change between kept keypoints"
+
+        previousKeyPoints = emptyKeyPoints
+        for horizonStart in range(0, myInterpolator.trajecLength - horizonLength, shift):
+            A_horizon = myInterpolator.A_matrices[horizonStart:horizonStart + horizonLength]
+
+            startTime = time.time()
+            keyPoints = myInterpolator.keyPoints_warmStart(A_horizon, previousKeyPoints, shift if horizonStart > 0 else 0, dynParameters)
+            warmTime += time.time() - startTime
+
+            startTime = time.time()
+            keyPoints_cold = myInterpolator.keyPoints_warmStart(A_horizon, emptyKeyPoints, 0, dynParameters)
+            coldTime += time.time() - startTime
+
+            if(horizonStart > 0):
+                assert segmentsWithinThreshold(myInterpolator, A_horizon, keyPoints, dynParameters), "warm start keypoints over the threshold at horizon " + str(horizonStart)
+                for i in range(myInterpolator.dof_vel):
+                    assert keyPoints[i][0] == 0 and keyPoints[i][-1] == horizonLength - 1
+                    newKeyPoints.append(len(set(keyPoints[i]) - set(np.array(previousKeyPoints[i]) - shift)))
+                    warmKeyPoints.append(len(keyPoints[i]))
+                    coldKeyPoints.append(len(keyPoints_cold[i]))
+                warmErrors.append(horizon_interpolation_error(myInterpolator, A_horizon, keyPoints))
+                coldErrors.append(horizon_interpolation_error(myInterpolator, A_horizon, keyPoints_cold))
+                horizons.append((A_horizon, previousKeyPoints, dynParameters))
+
+            previousKeyPoints = keyPoints
+
+    # Each midpointErrors call is one vectorised round over every dof, count them for both starts
+    midpointErrors = myInterpolator.midpointErrors
+    rounds = []
+    myInterpolator.midpointErrors = lambda *arguments: rounds.append(1) or midpointErrors(*arguments)
+    for A_horizon, previousKeyPoints, dynParameters in horizons:
+        myInterpolator.keyPoints_warmStart(A_horizon, previousKeyPoints, shift, dynParameters)
+    warmRounds = len(rounds)
+    for A_horizon, previousKeyPoints, dynParameters in horizons:
+        myInterpolator.keyPoints_warmStart(A_horizon, emptyKeyPoints, 0, dynParameters)
+    coldRounds = len(rounds) - warmRounds
+    del myInterpolator.midpointErrors
+
+    assert warmRounds < coldRounds, "warm start needs " + str(warmRounds) + " rounds of midpointErrors vs " + str(coldRounds) + " for a cold start"
+    assert warmTime < 1.1 * coldTime, "warm start (" + str(round(warmTime, 3)) + " s) is slower than a cold start (" + str(round(coldTime, 3)) + " s)"
+
+    return warmTime, coldTime, np.mean(newKeyPoints), np.mean(warmKeyPoints), np.mean(coldKeyPoints), np.mean(warmErrors), np.mean(coldErrors)
+
+def matchesReference(values, reference):
+    '''
+    Float64 interpolations must equal the reference exactly, reduced precision ones only up to rounding.
+
+    '''
+    if(values.dtype == np.float64):
+        return np.array_equal(values, reference)
+    return np.allclose(values, reference, rtol=1e-5, atol=1e-6)
+
+def check_lin_interpolation(task, trajecNumber, dynParams, dtype = np.float64):
+    '''
+    Check the vectorised generateLinInterpolation matches the reference loop for every
+    parameter set, and with a quaternion w column. Float64 must be bit for bit, reduced
+    precision within a tolerance. Returns the time taken by both.
+
+    '''
+    myInterpolator, keyPoints = loadKeypointSweep(task, trajecNumber, dynParams, dtype)
+    key_points_w = myInterpolator.keyPoints_quaternion_w()
+    times = [0, 0]
+
+    for parameterKeyPoints in keyPoints:
+        (A_interpolation, B_interpolation), (A_reference, B_reference) = compareWithReference(
+            myInterpolator.generateLinInterpolation, lambda *arguments: generateLinInterpolation_reference(myInterpolator, *arguments),
+            (myInterpolator.A_matrices, myInterpolator.B_matrices, parameterKeyPoints, key_points_w), times)
+        assert A_interpolation.dtype == A_reference.dtype and B_interpolation.dtype == B_reference.dtype
+        assert matchesReference(A_interpolation, A_reference), "A interpolation differs from reference"
+        assert matchesReference(B_interpolation, B_reference), "B interpolation differs from reference"
+
+    key_points_w = quaternionKeyPoints(myInterpolator)
+    A_interpolation, B_interpolation = myInterpolator.generateLinInterpolation(myInterpolator.A_matrices, myInterpolator.B_matrices, keyPoints[0], key_points_w)
+    A_reference, B_reference = generateLinInterpolation_reference(myInterpolator, myInterpolator.A_matrices, myInterpolator.B_matrices, keyPoints[0], key_points_w)
+    assert matchesReference(A_interpolation, A_reference), "quaternion w interpolation differs from reference"
+
+    return times[0], times[1]
+
+def check_interpolated_matrices(task, trajecNumber, dynParams, dtype = np.float64):
+    '''
+    Check the lazy interpolatedMatrices view gives the same values as stacking generateLinInterpolation
+    for every parameter set, whole and for the slices the GUI and plots take. Returns the bytes held by
+    the view and by the dense (P, T, n, n) tensor.
+
+    '''
+    myInterpolator, keyPoints = loadKeypointSweep(task, trajecNumber, dynParams, dtype)
+
+    for quaternion in [False, True]:
+        key_points_w = myInterpolator.keyPoints_quaternion_w()
+        if quaternion:
+            key_points_w = quaternionKeyPoints(myInterpolator)
+
+        interpolations = [myInterpolator.generateLinInterpolation(myInterpolator.A_matrices, myInterpolator.B_matrices, parameterKeyPoints, key_points_w)
+                          for parameterKeyPoints in keyPoints]
+
+        for matrixType, matrices, dense in [("A", myInterpolator.A_matrices, np.array([interpolation[0] for interpolation in interpolations])),
+                                            ("B", myInterpolator.B_matrices, np.array([interpolation[1] for interpolation in interpolations]))]:
+            view = myInterpolator.returnInterpolatedMatrices(matrixType, matrices, keyPoints, key_points_w)
+            assert view.shape == dense.shape and np.asarray(view).dtype == dense.dtype
+            assert np.array_equal(np.asarray(view), dense), matrixType + " interpolatedMatrices differs from generateLinInterpolation"
+
+            for key in [(0, slice(None), 0, 0), (1, slice(None), 1), (len(keyPoints) - 1, -1), (slice(1, 3), slice(10, 400, 7), slice(None), 0),
+                        (0, [0, 5, 1000], 1, slice(None)), (-1, myInterpolator.trajecLength - 2, 0, -1), (slice(None), slice(None), [1, 0], 0),
+                        (slice(0, 2), 7, [0, 1])]:
+                assert np.array_equal(view[key], dense[key]), matrixType + " interpolatedMatrices slice " + str(key) + " differs"
+
+            for key in [(Ellipsis, 0), (0, 10, None), (0, slice(10, 20), slice(None), [0, 0]), (slice(None), [1, 5], [0, 1]), (0, 0, 0, 0, 0)]:
+                try:
+                    view[key]
+                    assert False, "interpolatedMatrices did not raise for " + str(key)
+                except IndexError:
+                    pass
+
+            if matrixType == "A" and not quaternion:
+                viewBytes = sum(spec[1].nbytes + spec[2].nbytes for specs in view.columnSpecs for spec in specs)
+                denseBytes = dense.nbytes
+
+    return viewBytes, denseBytes
+
+def check_interpolation_errors(task, trajecNumber, dynParams, dtype = np.float64):
+    '''
+    Check InterpolateTrajectoryErrors scores every parameter set the same as InterpolateTrajectory (up
+    to summation order) and counts the same keypoints. Returns the time taken by both.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True, dtype=dtype)
+    times = [0, 0]
+
+    (errors, keyPointCounts), (_, _, _, referenceErrors, keyPoints, _) = compareWithReference(myInterpolator.InterpolateTrajectoryErrors,
+                                                                                             lambda dynParams: myInterpolator.InterpolateTrajectory(0, dynParams), (dynParams,), times)
+
+    assert np.allclose(errors, referenceErrors, rtol=1e-12, atol=0), "fused interpolation errors differ from InterpolateTrajectory"
+    assert np.array_equal(keyPointCounts, [sum(len(dofKeyPoints) for dofKeyPoints in parameterKeyPoints) for parameterKeyPoints in keyPoints])
+
+    # Comparing precisions scores both runs against the float64 matrices, and is a no-op in float64
+    errors, _ = myInterpolator.InterpolateTrajectoryErrors(dynParams, comparePrecision=True)
+    errorDelta = myInterpolator.precisionErrorDelta
+    _, _, _, referenceErrors, _, _ = myInterpolator.InterpolateTrajectory(0, dynParams, comparePrecision=True)
+    assert np.allclose(errors, referenceErrors, rtol=1e-9, atol=0), "fused interpolation errors differ from InterpolateTrajectory when comparing precision"
+    assert np.allclose(errorDelta, myInterpolator.precisionErrorDelta, rtol=1e-6, atol=1e-12), "precision error deltas differ from InterpolateTrajectory"
+
+    float64Errors, _ = interpolator(task, trajecNumber, preload=True).InterpolateTrajectoryErrors(dynParams)
+    assert np.allclose(errors - errorDelta, float64Errors, rtol=1e-9, atol=0), "precision error delta is not relative to float64"
+    if(dtype == np.float64):
+        assert not np.any(errorDelta) and np.array_equal(errors, float64Errors)
+
+    return times[0], times[1]
+
+def check_interpolation_kernels(task, trajecNumber, dynParams, dtype = np.float64):
+    '''
+    Check every interpolation kernel against scipy evaluating the same spline over each interpolated
+    column, and that InterpolateTrajectoryErrors scores it the same as InterpolateTrajectory. Returns
+    the errors and keypoint counts of dynParams with every kernel, (kernels, P) each.
+
+    '''
+    myInterpolator, keyPoints = loadKeypointSweep(task, trajecNumber, dynParams, dtype)
+    key_points_w = myInterpolator.keyPoints_quaternion_w()
+    splines = {"cubicHermite": PchipInterpolator, "naturalCubicSpline": lambda x, y, axis: CubicSpline(x, y, axis=axis, bc_type="natural")}
+
+    for interpolationMethod, spline in splines.items():
+        for parameterKeyPoints in keyPoints:
+            A_interpolation, B_interpolation = myInterpolator.generateInterpolation(myInterpolator.A_matrices, myInterpolator.B_matrices,
+                                                                                    parameterKeyPoints, key_points_w, interpolationMethod)
+            assert A_interpolation.dtype == myInterpolator.A_matrices.dtype
+
+            for i in range(myInterpolator.dof_vel):
+                dofKeyPoints = np.unique(parameterKeyPoints[i])
+                timesteps = np.arange(dofKeyPoints[0], min(dofKeyPoints[-1], myInterpolator.trajecLength - 1))
+                for column in [myInterpolator.pos_columns[i], myInterpolator.vel_columns[i]]:
+                    reference = spline(dofKeyPoints, myInterpolator.A_matrices[dofKeyPoints, :, column].astype(np.float64), axis=0)(timesteps)
+                    assert np.allclose(A_interpolation[timesteps, :, column], reference, rtol=1e-5, atol=1e-6), interpolationMethod + " differs from scipy"
+
+    errors = []
+    keyPointCounts = []
+    for interpolationMethod in INTERPOLATION_METHODS:
+        kernelParams = [derivative_interpolator(**{**vars(dynParameters), "interpolation_method": interpolationMethod}) for dynParameters in dynParams]
+        kernelErrors, kernelKeyPointCounts = myInterpolator.InterpolateTrajectoryErrors(kernelParams)
+        referenceErrors = myInterpolator.InterpolateTrajectory(0, kernelParams)[3]
+        assert np.allclose(kernelErrors, referenceErrors, rtol=1e-9, atol=0), interpolationMethod + " fused errors differ from InterpolateTrajectory"
+        windowedErrors = myInterpolator.InterpolateTrajectoryWindowed(kernelParams, myInterpolator.trajecLength)[0]
+        assert np.allclose(windowedErrors, referenceErrors, rtol=1e-6, atol=0), interpolationMethod + " windowed errors differ from InterpolateTrajectory"
+        if(interpolationMethod != "linear"):
+            try:
+                myInterpolator.InterpolateTrajectorySparse(kernelParams)
+                assert False, "InterpolateTrajectorySparse did not raise for " + interpolationMethod
+            except ValueError:
+                pass
+        errors.append(kernelErrors)
+        keyPointCounts.append(kernelKeyPointCounts)
+
+    try:
+        myInterpolator.generateInterpolation(myInterpolator.A_matrices, myInterpolator.B_matrices, keyPoints[0], key_points_w, "quadratic")
+        assert False, "unknown interpolation method did not raise"
+    except ValueError:
+        pass
+
+    return np.array(errors), np.array(keyPointCounts)
+
+def check_derivative_columns(task, trajecNumber, dynParams):
+    '''
+    Check recording the derivative evaluations doesn't change the errors, and that each (timestep, dof)
+    of the sweep's keypoints is counted exactly once, also when A and B are loaded lazily. Returns the
+    distinct evaluations and the keypoints requested.
+
+    '''
+    myInterpolator = interpolator(task, trajecNumber, preload=True)
+    errors, keyPointCounts = myInterpolator.InterpolateTrajectoryErrors(dynParams)
+    numEvaluations = myInterpolator.returnNumDerivativeEvaluations()
+
+    keyPoints = myInterpolator.generateKeypoints(myInterpolator.A_matrices, myInterpolator.B_matrices, myInterpolator.states.copy(),
+                                                 myInterpolator.controls.copy(), dynParams)
+    key_points_w = myInterpolator.keyPoints_quaternion_w()
+    # Copies of the matrices aren't recorded as evaluations
+    referenceErrors = myInterpolator.calcInterpolationErrors("A", myInterpolator.A_matrices.copy(), keyPoints, key_points_w)
+    referenceErrors += myInterpolator.calcInterpolationErrors("B", myInterpolator.B_matrices.copy(), keyPoints, key_points_w)
+    assert np.array_equal(errors, referenceErrors), "errors with derivative evaluations recorded differ"
+
+    distinct = set((int(t), i) for parameterKeyPoints in keyPoints for i in range(myInterpolator.dof_vel) for t in parameterKeyPoints[i])
+    assert numEvaluations == len(distinct), "derivative evaluations recorded " + str(numEvaluations) + " of " + str(len(distinct))
+
+    # A second sweep over the same trajectory needs no new evaluations
+    myInterpolator.InterpolateTrajectory(0, dynParams)
+    assert myInterpolator.returnNumDerivativeEvaluations() == numEvaluations
+
+    # Reloading the A matrices clears the evaluations
+    myInterpolator.loadComponent("A_matrices")
+    assert myInterpolator.returnNumDerivativeEvaluations() == 0
+
+    # Reading A before B has been loaded, B is loaded lazily while the evaluations are recorded
+    lazyInterpolator = interpolator(task, trajecNumber)
+    lazyErrors = lazyInterpolator.calcInterpolationErrors("A", lazyInterpolator.A_matrices, keyPoints, key_points_w)
+    assert np.array_equal(lazyErrors, myInterpolator.calcInterpolationErrors("A", myInterpolator.A_matrices.copy(), keyPoints, key_points_w))
+    assert lazyInterpolator.returnNumDerivativeEvaluations() == numEvaluations
+
+    return numEvaluations, int(np.sum(keyPointCounts))
+
+def makeFloatingBaseTask(numTrajectories, trajecLength):
+    '''
+    Write a scratch task for a floating base robot with one joint, so dof_pos = 8 (xyz, wxyz
+    quaternion and the joint) differs from dof_vel = 7. Its trajectories are sums of random
+    sinusoids, remove it with shutil.rmtree(taskPath(scratchTask)). Returns its name.
+
+    '''
+    scratchTask = "regression_scratch_floating_base"
+    shutil.rmtree(taskPath(scratchTask), ignore_errors=True)
+    os.makedirs(taskPath(scratchTask))
+    with open(taskPath(scratchTask) + "/" + META_DATA_FILE, 'w') as file:
+        file.write("robots:\n  floating:\n    base: True\n    num_joints: 1\n    num_actuators: 1\n")
+
+    num_states = 15
+    num_ctrl = 1
+    generator = np.random.default_rng(0)
+    timesteps = np.linspace(0, 1, trajecLength)[:, None]
+    for trajecNumber in range(numTrajectories):
+        os.makedirs(trajecPath(scratchTask, trajecNumber))
+        for component, numColumns in [("A_matrices", num_states * num_states), ("B_matrices", num_states * num_ctrl), ("states", num_states), ("controls", num_ctrl)]:
+            data = np.zeros((trajecLength, numColumns))
+            for k in range(3):
+                data += generator.uniform(0.1, 1, numColumns) * np.sin(2 * np.pi * generator.uniform(1, 8, numColumns) * timesteps + generator.uniform(0, 2 * np.pi, numColumns))
+            # One row per timestep with a trailing comma, like the saved trajectories
+            np.savetxt(trajecPath(scratchTask, trajecNumber) + "/" + component + ".csv", data, fmt="%.9g", delimiter=",", newline=",\n")
+
+    return scratchTask
+
+def check_floating_base():
+    '''
+    Run the checks that depend on the state column layout on a floating base task, where the velocity
+    columns start at dof_pos rather than dof_vel and the quaternion w column has no velocity dof.
+
+    '''
+    task = makeFloatingBaseTask(2, 1200)
+    try:
+        myInterpolator = interpolator(task, 0, preload=True)
+        assert myInterpolator.dof_pos == 8 and myInterpolator.dof_vel == 7 and list(myInterpolator.quat_w_indices) == [3]
+        assert list(myInterpolator.pos_columns) == [0, 1, 2, 4, 5, 6, 7] and list(myInterpolator.vel_columns) == list(range(8, 15))
+
+        set_interval_methods, jerk_methods, vel_methods, iter_error_methods = return_interpolation_settings("acrobot")
+        accel_methods = [derivative_interpolator("adaptiveAccel", minN, maxN, threshold, 0, 0, 0) for minN, maxN in [(5, 100), (1, 20)] for threshold in [0.0001, 0.01]]
+        interpolation_methods = set_interval_methods + jerk_methods[::4] + vel_methods[::4] + iter_error_methods[::4]
+        for trajecNumber in range(2):
+            check_derived_signals(task, trajecNumber, 1)
+            check_keyPoints(task, trajecNumber, adaptiveJerkKeyPoints, keyPoints_adaptiveJerk_reference, jerk_methods)
+            check_keyPoints(task, trajecNumber, adaptiveAccelKeyPoints, keyPoints_adaptiveAccel_reference, accel_methods)
+            check_keyPoints(task, trajecNumber, magVelChangeKeyPoints, keyPoints_magVelChange_reference, vel_methods)
+            check_keyPoints(task, trajecNumber, iterativeKeyPoints, keyPoints_iteratively_reference, iter_error_methods[::4])
+            check_online_keyPoints(task, trajecNumber, jerk_methods[::4] + vel_methods[::4] + accel_methods)
+            check_midpoint_errors(task, trajecNumber, 2000)
+            check_lin_interpolation(task, trajecNumber, interpolation_methods)
+            check_interpolation_errors(task, trajecNumber, interpolation_methods)
+        check_lin_interpolation(task, 0, interpolation_methods, np.float32)
+        check_interpolated_matrices(task, 0, interpolation_methods)
+
+        # Column dof_vel is the joint position, the velocity methods must only read the velocity columns
+        scrambledStates = myInterpolator.states.copy()
+        scrambledStates[:, :myInterpolator.dof_pos] = np.random.default_rng(1).normal(size=(myInterpolator.trajecLength, myInterpolator.dof_pos))
+        for dynParameters in vel_methods:
+            assert myInterpolator.keyPoints_magVelChange(scrambledStates, myInterpolator.controls, dynParameters) == magVelChangeKeyPoints(myInterpolator, dynParameters), \
+                "magVelChange keypoints depend on the position columns"
+        for dynParameters in jerk_methods:
+            assert myInterpolator.keyPoints_adaptiveJerk(scrambledStates, dynParameters) == adaptiveJerkKeyPoints(myInterpolator, dynParameters), \
+                "adaptiveJerk keypoints depend on the position columns"
+    finally:
+        shutil.rmtree(taskPath(task), ignore_errors=True)
+
+def print_benchmark(name, methodTime, referenceTime):
+    print(name + ": OK (" + str(round(methodTime, 3)) + " s vs reference " + str(round(referenceTime, 3)) + " s, " + str(round(referenceTime / methodTime, 1)) + "x)")
+
+def benchmarkCheck(name, check, task, numTrajectories, *arguments):
+    # Run a check returning (method time, reference time) on each trajectory and print the totals
+    methodTime = 0
+    referenceTime = 0
+    for i in range(numTrajectories):
+        times = check(task, i, *arguments)
+        methodTime += times[0]
+        referenceTime += times[1]
+    print_benchmark(name, methodTime, referenceTime)
+
+def main():
+    numTrajectories = 10
+
+    for task in TASKS:
+        print("----------------------- " + task + " -----------------------")
+        startTime = time.time()
+        for i in range(numTrajectories):
+            check_matrix_unpacking(task, i)
+        print("matrix unpacking: OK (" + str(round(time.time() - startTime, 3)) + " s)")
+
+        check_trajec_cache(task)
+        print("trajectory cache invalidation: OK")
+
+        check_trajec_manifest(task)
+        print("invalid trajectory detection: OK")
+
+        for i in range(3):
+            check_lazy_loading(task, i)
+        print("lazy loading: OK")
+
+        for numWorkers, maxInFlight in [(2, 1), (2, 3), (4, 20)]:
+            check_load_interpolators(task, [7, 2, 9, 0, 5, 1], numWorkers, maxInFlight)
+        print("parallel loading: OK")
+
+        set_interval_methods, jerk_methods, vel_methods, iter_error_methods = return_interpolation_settings("acrobot")
+        windowed_methods = set_interval_methods + jerk_methods[::8] + vel_methods[::8] + iter_error_methods[::8]
+        for i in range(3):
+            check_windowed_interpolation(task, i, windowed_methods)
+        print("windowed interpolation: OK")
+
+        check_task_dataset(task)
+        print("stacked task datasets: OK")
+
+        sparse_methods = return_interpolation_settings("acrobot")[0] + return_interpolation_settings("acrobot")[3][::4]
+        for i in range(3):
+            check_sparse_matrices(task, i, sparse_methods)
+        print("sparse matrices with constant entries: OK")
+
+        startTime = time.time()
+        for i in range(numTrajectories):
+            check_keypoint_registry(task, i)
+        print("keypoint method registry: OK (" + str(round(time.time() - startTime, 3)) + " s)")
+
+        benchmarkCheck("jerk / accel profiles (20 requests each)", check_derived_signals, task, numTrajectories, 20)
+
+        setInterval_methods = [derivative_interpolator("setInterval", minN, 0, 0, 0, 0, 0) for minN in [0, 1, 2, 5, 10, 15, 20, 5000]]
+        benchmarkCheck("setInterval keypoints", check_keyPoints, task, numTrajectories, interpolator.keyPoints_setInterval, keyPoints_setInterval_reference, setInterval_methods)
+
+        # Includes minN / maxN <= 0, where the reference places repeated keypoints on the same timestep
+        adaptiveJerk_methods = []
+        adaptiveAccel_methods = []
+        for minN, maxN in [(5, 100), (10, 200), (1, 20), (0, 50), (3, 3), (20, 5), (5, 0), (0, 0)]:
+            for threshold in [0.0, 0.0001, 0.001, 0.01, 0.1]:
+                adaptiveJerk_methods.append(derivative_interpolator("adaptiveJerk", minN, maxN, 0, threshold, 0, 0))
+                adaptiveAccel_methods.append(derivative_interpolator("adaptiveAccel", minN, maxN, threshold, 0, 0, 0))
+
+        benchmarkCheck("adaptiveJerk keypoints", check_keyPoints, task, numTrajectories, adaptiveJerkKeyPoints, keyPoints_adaptiveJerk_reference, adaptiveJerk_methods)
+        benchmarkCheck("adaptiveAccel keypoints", check_keyPoints, task, numTrajectories, adaptiveAccelKeyPoints, keyPoints_adaptiveAccel_reference, adaptiveAccel_methods)
+
+        # Same comparison with the profiles computed up front, timing only the keypoint state machine
+        for name, dynParams in [("adaptiveJerk state machine", adaptiveJerk_methods), ("adaptiveAccel state machine", adaptiveAccel_methods)]:
+            benchmarkCheck(name, check_adaptiveThreshold, task, numTrajectories, dynParams)
+
+        # Settings grid plus edge cases: maxN <= 0, maxN longer than the trajectory and no velocity change limit
+        magVelChange_methods = return_interpolation_settings("acrobot")[2]
+        magVelChange_methods = magVelChange_methods + [derivative_interpolator("magVelChange", minN, maxN, 0, 0, 0, velChange)
+                                                       for minN, maxN, velChange in [(0, 0, 0.5), (1, 1, 0.0), (5, 5000, 1.0), (3, 10, 1e9), (10, 5, 0.2)]]
+        benchmarkCheck("magVelChange keypoints", check_keyPoints, task, numTrajectories, magVelChangeKeyPoints, keyPoints_magVelChange_reference, magVelChange_methods)
+
+        iterative_methods = return_interpolation_settings("acrobot")[3]
+        benchmarkCheck("iterativeError keypoints", check_keyPoints, task, numTrajectories, iterativeKeyPoints, keyPoints_iteratively_reference, iterative_methods)
+
+        benchmarkCheck("midpoint errors (20000 segments)", check_midpoint_errors, task, numTrajectories, 20000)
+
+        benchmarkCheck("iterativeErrorPriority keypoints", check_iterativePriority, task, numTrajectories, iterative_methods, [10, 20, 50, 100, 200])
+
+        online_methods = return_interpolation_settings("acrobot")[1][::4] + return_interpolation_settings("acrobot")[2][::4] + adaptiveAccel_methods[::6]
+        stepTime = 0
+        for i in range(numTrajectories):
+            stepTime += check_online_keyPoints(task, i, online_methods)
+        check_online_keyPoints(task, 0, online_methods, np.float32)
+        print("online keypoint detector: OK (" + str(round(stepTime / numTrajectories * 1e6, 1)) + " us per state)")
+
+        warm_start_methods = iterative_methods[::5]
+        warmTime = 0
+        coldTime = 0
+        results = []
+        for i in range(3):
+            times = check_warm_start(task, i, warm_start_methods, 500, 10)
+            warmTime += times[0]
+            coldTime += times[1]
+            results.append(times[2:])
+        results = np.mean(results, axis=0)
+        print_benchmark("warm started receding horizon keypoints", warmTime, coldTime)
+        print("    keypoints per dof per horizon: warm " + str(round(results[1], 1)) + " (" + str(round(results[0], 1)) + " new) vs cold " + str(round(results[2], 1)) +
+              ", MAE warm " + str(round(results[3], 6)) + " vs cold " + str(round(results[4], 6)))
+
+        set_interval_methods, jerk_methods, vel_methods, iter_error_methods = return_interpolation_settings("acrobot")
+        interpolation_methods = set_interval_methods + jerk_methods[::4] + vel_methods[::4] + iter_error_methods[::4] + [derivative_interpolator("setInterval", 1, 0, 0, 0, 0, 0)]
+        benchmarkCheck("linear interpolation (" + str(len(interpolation_methods)) + " parameter sets)", check_lin_interpolation, task, numTrajectories, interpolation_methods)
+        check_lin_interpolation(task, 0, interpolation_methods, np.float32)
+
+        benchmarkCheck("fused interpolation errors (" + str(len(interpolation_methods)) + " parameter sets)", check_interpolation_errors, task, numTrajectories, interpolation_methods)
+        check_interpolation_errors(task, 0, interpolation_methods, np.float32)
+
+        # MAE of each kernel over the same keypoints, with the keypoints needed to reach the linear MAE
+        kernel_methods = set_interval_methods + [derivative_interpolator("setInterval", minN, 0, 0, 0, 0, 0) for minN in [3, 4, 7, 30, 40]] + iter_error_methods[::4]
+        errors = []
+        for i in range(3):
+            kernelErrors, keyPointCounts = check_interpolation_kernels(task, i, kernel_methods)
+            errors.append(kernelErrors)
+        check_interpolation_kernels(task, 0, kernel_methods[::3], np.float32)
+        errors = np.mean(errors, axis=0)
+        print("interpolation kernels: OK")
+        for k, interpolationMethod in enumerate(INTERPOLATION_METHODS):
+            print("    " + interpolationMethod + ": MAE " + str(round(float(np.median(errors[k] / errors[0])), 3)) + "x linear (median over parameter sets)")
+
+        numEvaluations = 0
+        numRequested = 0
+        for i in range(numTrajectories):
+            evaluations = check_derivative_columns(task, i, interpolation_methods)
+            numEvaluations += evaluations[0]
+            numRequested += evaluations[1]
+        print("derivative evaluations: OK (" + str(numEvaluations) + " distinct (timestep, dof) evaluations for " + str(numRequested) +
+              " keypoints over the sweep, " + str(round(numRequested / numEvaluations, 1)) + "x fewer)")
+
+        viewBytes, denseBytes = check_interpolated_matrices(task, 0, interpolation_methods)
+        check_interpolated_matrices(task, 0, interpolation_methods, np.float32)
+        print("lazy interpolated matrices: OK (" + str(round(viewBytes / 1e6, 2)) + " MB vs dense " + str(round(denseBytes / 1e6, 2)) + " MB for A)")
+
+    print("----------------------- floating base -----------------------")
+    check_floating_base()
+    print("floating base state columns: OK")
+
+if __name__ == "__main__":
+    main()
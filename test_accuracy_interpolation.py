@@ -3,6 +3,7 @@ import numpy as np
 from numpy import genfromtxt
 from interpolateDynamics import *
 from interpolation_settings import *
+from trajecData import buildTaskManifest, buildTaskDataset, validTrajecNumbers, taskDataset
 
 
 def main():
@@ -16,6 +17,10 @@ def main():
         print("----------------------- " + taskName + " -----------------------")
         numTrajectories = 100
 
+        # Check the csv files and parse them once, every sweep below then memory-maps the stacked task dataset
+        buildTaskManifest(taskName, range(numTrajectories))
+        buildTaskDataset(taskName, validTrajecNumbers(taskName, range(numTrajectories)))
+
         methods = []
         errors_methods = []
         percentage_derivs_methods = []
@@ -79,26 +84,42 @@ def main():
         # Save set inteval methods in separate file due to incompatible lengths
         np.savez("results_interpolation_accuracy/" + taskName + "_set_interval.npz", error_set_interval=error_set_interval, percentage_derivs_set_interval=percentage_derivs_set_interval)
 
-def evaluate_approximation(task_name, keypoint_methods, numTrajectories):
+def evaluate_approximation(task_name, keypoint_methods, numTrajectories, dtype = np.float64):
 
     numMethods = len(keypoint_methods)
 
-    errors = np.zeros((numTrajectories, numMethods))
-    percentage_derivs = np.zeros((numTrajectories, numMethods))
-    for i in range(numTrajectories):
-        myInterpolator = interpolator(task_name, i)
+    # Trajectories the manifest marks as corrupt are skipped
+    trajecNumbers = validTrajecNumbers(task_name, range(numTrajectories))
+
+    # Trajectories are memory-mapped views into the task dataset, only the one being evaluated is resident
+    dataset = taskDataset(task_name, trajecNumbers)
+
+    errors = np.zeros((len(trajecNumbers), numMethods))
+    percentage_derivs = np.zeros((len(trajecNumbers), numMethods))
+    precision_error_deltas = np.zeros((len(trajecNumbers), numMethods))
+    num_keyPoints = 0
+    num_evaluations = 0
+    for i in range(len(trajecNumbers)):
+        myInterpolator = interpolator(task_name, trajecNumbers[i], dataset=dataset, dtype=dtype)
         dof = myInterpolator.dof_vel
         horizon = myInterpolator.trajecLength
         total_column_derivs = dof * horizon
-        _, _, _, task_errors, task_keyPoints, task_w_keyPoints = myInterpolator.interpolateTrajectory(0, keypoint_methods)
 
-        for j in range(numMethods):
-            errors[i][j] = task_errors[j]
-            sum_keyPoints = 0
-            for k in range(dof):
-                sum_keyPoints += len(task_keyPoints[j][k])
+        # Only the scores are needed, so the interpolated matrices are never built. Reduced precision
+        # runs are scored against the float64 matrices and report the change in error.
+        task_errors, task_keyPoint_counts = myInterpolator.InterpolateTrajectoryErrors(keypoint_methods, comparePrecision = dtype != np.float64)
+
+        errors[i] = task_errors
+        precision_error_deltas[i] = myInterpolator.precisionErrorDelta
+        percentage_derivs[i] = (task_keyPoint_counts / total_column_derivs) * 100
+
+        # Keypoints shared between parameter sets are only evaluated once
+        num_keyPoints += np.sum(task_keyPoint_counts)
+        num_evaluations += myInterpolator.returnNumDerivativeEvaluations()
 
-            percentage_derivs[i][j] = (sum_keyPoints / total_column_derivs) * 100
+    print("distinct derivative evaluations: " + str(num_evaluations) + " for " + str(num_keyPoints) + " keypoints")
+    if(dtype != np.float64):
+        print("max change in error from " + np.dtype(dtype).name + ": " + str(np.max(np.abs(np.mean(precision_error_deltas, axis=0)))))
 
     # Calculate the average error and percentage of derivatives
     avg_errors = np.mean(errors, axis=0)
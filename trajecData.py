@@ -0,0 +1,691 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+import shutil
+import json
+import hashlib
+import math
+import warnings
+import yaml
+from dataclasses import dataclass
+
+# Loading of the trajectory information saved in savedTrajecInfo/<task>/<trajecNumber>/. Each
+# trajectory is stored as four csv files (one row per timestep, trailing comma on every row).
+# Parsing the csv files is slow, so a binary cache of .npy files can be built next to them with
+# buildTrajecCache. The cache is keyed on the size and modification time of the csv files and is
+# used transparently by loadTrajecComponent whenever it is up to date.
+#
+# For sweeps over a whole task, buildTaskDataset stacks the trajectories of a task into one .npy
+# file per component in savedTrajecInfo/<task>/cache/, parsed straight from the csv files. There is
+# a single store per task that grows to cover every trajectory asked for, taskDataset memory-maps it
+# and indexes the trajectories of a sweep out of it, so only the ones currently being worked on are
+# resident.
+#
+# buildTaskManifest scans every csv file of a task once and records its shape, size and content
+# hash in savedTrajecInfo/<task>/cache/manifest.json, marking trajectories whose files are truncated,
+# ragged or disagree in length as invalid so loaders can check and skip them without parsing.
+
+TRAJEC_COMPONENTS = ["A_matrices", "B_matrices", "states", "controls"]
+META_DATA_FILE = "meta_data.yaml"
+CACHE_FOLDER = "cache"
+CACHE_KEY_FILE = "cache_key.json"
+DATASET_KEY_FILE = "dataset_key.json"
+MANIFEST_FILE = "manifest.json"
+
+def taskPath(task):
+    return "savedTrajecInfo/" + task
+
+def trajecPath(task, trajecNumber):
+    return taskPath(task) + "/" + str(trajecNumber)
+
+def cachePath(task, trajecNumber):
+    return trajecPath(task, trajecNumber) + "/" + CACHE_FOLDER
+
+def datasetPath(task):
+    return taskPath(task) + "/" + CACHE_FOLDER
+
+def returnTrajecNumbers(task):
+    '''
+    Return the (sorted) trajectory numbers saved for a task
+
+    '''
+    trajecNumbers = []
+    for entry in os.listdir(taskPath(task)):
+        if entry.isdigit() and os.path.isdir(taskPath(task) + "/" + entry):
+            trajecNumbers.append(int(entry))
+
+    trajecNumbers.sort()
+    return trajecNumbers
+
+@dataclass
+class taskDescriptor():
+    '''
+    Everything derived from the meta_data.yaml of a task. The column arrays index both the state
+    vector and the columns of the A matrices:
+
+    quat_w_indices: the quaternion w position columns, which have no velocity dof
+    pos_columns:    the position column matching each velocity dof (quaternion w's excluded)
+    vel_columns:    the velocity column of each velocity dof
+
+    '''
+    task: str
+    robots: dict
+    bodies: dict
+    dof_pos: int
+    dof_vel: int
+    num_ctrl: int
+    quat_w_indices: list
+    pos_columns: np.ndarray
+    vel_columns: np.ndarray
+
+# Parsed task descriptors, keyed on task name, along with the meta_data.yaml modification time they were parsed at
+taskDescriptors = {}
+
+def parseTaskDescriptor(task):
+    with open(taskPath(task) + "/" + META_DATA_FILE, 'r') as file:
+        task_config = yaml.safe_load(file)
+
+    robots = task_config['robots']
+    bodies = []
+    try:
+        bodies = task_config['bodies']
+    except:
+        pass
+
+    dof_pos = 0
+    dof_vel = 0
+    num_ctrl = 0
+    quat_w_indices = []
+    for robot in robots:
+        try:
+            if(robots[robot]['base'] == True):
+                # Floating base, xyz position and wxyz quaternion
+                dof_pos += 7
+                dof_vel += 6
+                quat_w_indices.append(dof_pos - 4)
+        except:
+            pass
+
+        dof_pos += robots[robot]['num_joints']
+        dof_vel += robots[robot]['num_joints']
+        num_ctrl += robots[robot]['num_actuators']
+
+    if(len(bodies)):
+        for body in bodies:
+            dof_pos += bodies[body]['positions']
+            dof_vel += (bodies[body]['positions'])
+
+            # TODO - this is quite hard coded atm and untested for multiple bodies with different orientations
+            try:
+                if(bodies[body]['orientation_no_w'] == 3):
+                    dof_vel += 3
+                    dof_pos += 3
+            except:
+                if( bodies[body]['orientations'] == 4):
+                    dof_vel += 3
+                    dof_pos += bodies[body]['orientations']
+                    quat_w_indices.append(dof_pos - 1)
+
+    pos_columns = np.array([column for column in range(dof_pos) if column not in quat_w_indices], dtype=int)
+    vel_columns = np.arange(dof_pos, dof_pos + dof_vel)
+
+    return taskDescriptor(task, robots, bodies, dof_pos, dof_vel, num_ctrl, quat_w_indices, pos_columns, vel_columns)
+
+def returnTaskDescriptor(task):
+    '''
+    Memoized taskDescriptor of a task, meta_data.yaml is only parsed again if it has been modified
+
+    '''
+    mtime = os.stat(taskPath(task) + "/" + META_DATA_FILE).st_mtime_ns
+    if task not in taskDescriptors or taskDescriptors[task][0] != mtime:
+        taskDescriptors[task] = (mtime, parseTaskDescriptor(task))
+
+    return taskDescriptors[task][1]
+
+def readTrajecCSVBlocks(task, trajecNumber, component, blockSize = None):
+    '''
+    Parse one csv file of a saved trajectory into C-contiguous float64 arrays of blockSize rows, the
+    whole file as one array if blockSize is None. Every row ends in a trailing comma, the empty
+    column it creates is dropped (scanTrajecCSV counts the columns to match).
+
+    '''
+    path = trajecPath(task, trajecNumber) + "/" + component + ".csv"
+    if blockSize is None:
+        blocks = [pd.read_csv(path, header=None)]
+    else:
+        blocks = pd.read_csv(path, header=None, chunksize=blockSize)
+
+    for pandas in blocks:
+        pandas = pandas[pandas.columns[:-1]]
+        yield np.ascontiguousarray(pandas.to_numpy(dtype=np.float64))
+
+def readTrajecCSV(task, trajecNumber, component):
+    # The whole csv file of one component as a single array
+    return next(readTrajecCSVBlocks(task, trajecNumber, component))
+
+def csvCacheKey(task, trajecNumber, component):
+    stat = os.stat(trajecPath(task, trajecNumber) + "/" + component + ".csv")
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def readCacheKeys(task, trajecNumber):
+    try:
+        with open(cachePath(task, trajecNumber) + "/" + CACHE_KEY_FILE, 'r') as file:
+            cacheKeys = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    return cacheKeys
+
+def cacheValid(task, trajecNumber, component, cacheKeys = None):
+    if cacheKeys is None:
+        cacheKeys = readCacheKeys(task, trajecNumber)
+
+    if component not in cacheKeys:
+        return False
+
+    if not os.path.exists(cachePath(task, trajecNumber) + "/" + component + ".npy"):
+        return False
+
+    return cacheKeys[component] == csvCacheKey(task, trajecNumber, component)
+
+def loadTrajecComponent(task, trajecNumber, component, useCache = True, dataset = None):
+    '''
+    Load one component (A_matrices, B_matrices, states or controls) of a saved trajectory. If a
+    taskDataset is passed the component is a memory-mapped view into it, otherwise if an up to
+    date binary cache exists it is loaded instead of parsing the csv file.
+
+    '''
+    if dataset is not None:
+        return dataset.trajecComponent(trajecNumber, component)
+
+    if useCache and cacheValid(task, trajecNumber, component):
+        return np.load(cachePath(task, trajecNumber) + "/" + component + ".npy")
+
+    return readTrajecCSV(task, trajecNumber, component)
+
+def loadTrajecComponents(task, trajecNumber, useCache = True):
+    '''
+    Load all components of a saved trajectory into a dictionary of (T, columns) arrays, with
+    every component cut to the length of the A matrices
+
+    '''
+    validateTrajec(task, trajecNumber)
+
+    components = {}
+    for component in TRAJEC_COMPONENTS:
+        components[component] = loadTrajecComponent(task, trajecNumber, component, useCache)
+
+    trajecLength = len(components["A_matrices"])
+    for component in TRAJEC_COMPONENTS:
+        components[component] = components[component][0:trajecLength]
+
+    return components
+
+def componentBlocks(task, trajecNumber, component, blockSize, useCache = True, dataset = None):
+    # Blocks of rows of one component, memory-mapped slices from a dataset or the cache, otherwise parsed csv chunks
+    if dataset is not None or (useCache and cacheValid(task, trajecNumber, component)):
+        if dataset is not None:
+            data = dataset.trajecComponent(trajecNumber, component)
+        else:
+            data = np.load(cachePath(task, trajecNumber) + "/" + component + ".npy", mmap_mode='r')
+
+        for i in range(0, len(data), blockSize):
+            yield data[i:i + blockSize]
+    else:
+        yield from readTrajecCSVBlocks(task, trajecNumber, component, blockSize)
+
+def readTrajecChunks(task, trajecNumber, windowSize, overlap = 0, useCache = True, dataset = None):
+    '''
+    Stream a saved trajectory as time windows of windowSize timesteps, consecutive windows sharing
+    overlap timesteps. Yields (startIndex, components), components being a dictionary of
+    (rows, columns) arrays like loadTrajecComponents. Only about one window of every component is
+    held in memory at a time.
+
+    '''
+    step = windowSize - overlap
+    if step <= 0:
+        raise ValueError("overlap (" + str(overlap) + ") must be smaller than windowSize (" + str(windowSize) + ")")
+
+    blocks = {}
+    buffers = {}
+    for component in TRAJEC_COMPONENTS:
+        blocks[component] = componentBlocks(task, trajecNumber, component, step, useCache, dataset)
+        buffers[component] = None
+
+    startIndex = 0
+    while True:
+        for component in TRAJEC_COMPONENTS:
+            while buffers[component] is None or len(buffers[component]) < windowSize:
+                block = next(blocks[component], None)
+                if block is None:
+                    break
+                if buffers[component] is None:
+                    buffers[component] = block
+                else:
+                    buffers[component] = np.concatenate((buffers[component], block))
+
+        # The trajectory length is defined by the A matrices, stop once a window adds no new timesteps
+        if buffers["A_matrices"] is None or (startIndex > 0 and len(buffers["A_matrices"]) <= overlap):
+            return
+
+        windowLength = min(windowSize, len(buffers["A_matrices"]))
+        components = {}
+        for component in TRAJEC_COMPONENTS:
+            components[component] = np.ascontiguousarray(buffers[component][0:windowLength])
+
+        yield startIndex, components
+
+        if windowLength < windowSize:
+            return
+
+        for component in TRAJEC_COMPONENTS:
+            buffers[component] = buffers[component][step:]
+        startIndex += step
+
+def trajecComponentShape(task, trajecNumber, component, useCache = True, dataset = None):
+    '''
+    (rows, columns) of one component of a saved trajectory without loading it. Uses the dataset
+    or cache headers when available, otherwise scans the csv file without parsing it (see scanTrajecCSV).
+
+    '''
+    if dataset is not None:
+        index = dataset.trajecIndex[trajecNumber]
+        return (int(dataset.trajecLengths[index]), dataset.flatComponents[component].shape[2])
+
+    if useCache and cacheValid(task, trajecNumber, component):
+        return np.load(cachePath(task, trajecNumber) + "/" + component + ".npy", mmap_mode='r').shape
+
+    entry = manifestEntry(task, trajecNumber, component)
+    if entry is None:
+        entry = scanTrajecCSV(task, trajecNumber, component)
+
+    return (entry['rows'], entry['cols'])
+
+def buildTrajecCache(task, trajecNumbers = None):
+    '''
+    One-time converter from the csv files of a task to the binary cache. Trajectories with an
+    up to date cache are skipped, so this is cheap to call before every sweep.
+
+    Returns the number of trajectory components (re)written.
+
+    '''
+    if trajecNumbers is None:
+        trajecNumbers = returnTrajecNumbers(task)
+
+    numWritten = 0
+    for trajecNumber in trajecNumbers:
+        cacheKeys = readCacheKeys(task, trajecNumber)
+        staleComponents = []
+        for component in TRAJEC_COMPONENTS:
+            if not cacheValid(task, trajecNumber, component, cacheKeys):
+                staleComponents.append(component)
+
+        if not len(staleComponents):
+            continue
+
+        os.makedirs(cachePath(task, trajecNumber), exist_ok=True)
+        for component in staleComponents:
+            # Take the key before parsing so a csv modified during conversion is caught next time
+            cacheKeys[component] = csvCacheKey(task, trajecNumber, component)
+            np.save(cachePath(task, trajecNumber) + "/" + component + ".npy", readTrajecCSV(task, trajecNumber, component))
+            numWritten += 1
+
+        with open(cachePath(task, trajecNumber) + "/" + CACHE_KEY_FILE, 'w') as file:
+            json.dump(cacheKeys, file)
+
+    return numWritten
+
+def readDatasetInfo(task):
+    try:
+        with open(datasetPath(task) + "/" + DATASET_KEY_FILE, 'r') as file:
+            datasetInfo = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    return datasetInfo
+
+def removeStaleDatasets(task):
+    # Stacked files left behind by older layouts (one dataset_<key> folder per trajectory set) or by an interrupted build
+    if not os.path.isdir(datasetPath(task)):
+        return
+
+    for entry in os.listdir(datasetPath(task)):
+        path = datasetPath(task) + "/" + entry
+        if entry.startswith("dataset_") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry.endswith(".tmp.npy"):
+            os.remove(path)
+
+def buildTaskDataset(task, trajecNumbers = None):
+    '''
+    Stack the trajectories of a task into the (N_trajec, T, columns) .npy file per component of its
+    store, which taskDataset memory-maps. The store keeps every trajectory it already holds (as long
+    as it still exists) and adds the ones asked for. Trajectories shorter than the longest one are
+    zero padded, their real lengths are stored in dataset_key.json. The store is only rewritten if a
+    trajectory is missing or any of its csv files changed, unchanged trajectories are then copied
+    over from the old store and only the others are parsed. The files are replaced rather than
+    overwritten so datasets that are still memory-mapping the old files are unaffected.
+
+    Returns True if the store was (re)written.
+
+    '''
+    if trajecNumbers is None:
+        trajecNumbers = returnTrajecNumbers(task)
+
+    removeStaleDatasets(task)
+
+    oldDatasetInfo = readDatasetInfo(task)
+    oldTrajecNumbers = oldDatasetInfo.get('trajec_numbers', [])
+    oldKeys = oldDatasetInfo.get('keys', {})
+
+    storedNumbers = set(trajecNumbers)
+    for trajecNumber in oldTrajecNumbers:
+        if os.path.isdir(trajecPath(task, trajecNumber)):
+            storedNumbers.add(trajecNumber)
+    storedNumbers = sorted(storedNumbers)
+
+    datasetKeys = {}
+    for trajecNumber in storedNumbers:
+        datasetKeys[str(trajecNumber)] = {}
+        for component in TRAJEC_COMPONENTS:
+            datasetKeys[str(trajecNumber)][component] = csvCacheKey(task, trajecNumber, component)
+
+    storePath = datasetPath(task)
+    oldComponents = {}
+    try:
+        for component in TRAJEC_COMPONENTS:
+            oldComponents[component] = np.load(storePath + "/" + component + ".npy", mmap_mode='r')
+    except FileNotFoundError:
+        oldComponents = {}
+        oldTrajecNumbers = []
+
+    if len(oldComponents) and oldKeys == datasetKeys:
+        return False
+
+    # Rows of the old store that can be copied over as they are
+    oldRows = {}
+    for i in range(len(oldTrajecNumbers)):
+        if oldKeys.get(str(oldTrajecNumbers[i])) == datasetKeys.get(str(oldTrajecNumbers[i])):
+            oldRows[oldTrajecNumbers[i]] = i
+
+    # The trajectory length is defined by the A matrices, all other components are cut to it
+    trajecLengths = []
+    numColumns = {}
+    for trajecNumber in storedNumbers:
+        for component in TRAJEC_COMPONENTS:
+            if trajecNumber in oldRows:
+                shape = (oldDatasetInfo['trajec_lengths'][oldRows[trajecNumber]], oldComponents[component].shape[2])
+            else:
+                shape = trajecComponentShape(task, trajecNumber, component, useCache=False)
+            if component == "A_matrices":
+                trajecLengths.append(shape[0])
+
+            if component not in numColumns:
+                numColumns[component] = shape[1]
+            elif numColumns[component] != shape[1]:
+                raise ValueError("trajectory " + str(trajecNumber) + " of task " + task + " has " + str(shape[1]) +
+                                 " columns in " + component + ", expected " + str(numColumns[component]))
+
+    os.makedirs(storePath, exist_ok=True)
+    maxLength = max(trajecLengths)
+    for component in TRAJEC_COMPONENTS:
+        # Written to a temporary file and moved into place, an open memory map keeps the old file
+        tempPath = storePath + "/" + component + ".tmp.npy"
+        stacked = np.lib.format.open_memmap(tempPath, mode='w+', dtype=np.float64,
+                                            shape=(len(storedNumbers), maxLength, numColumns[component]))
+        for i in range(len(storedNumbers)):
+            if storedNumbers[i] in oldRows:
+                trajecData = oldComponents[component][oldRows[storedNumbers[i]], 0:trajecLengths[i]]
+            else:
+                trajecData = readTrajecCSV(task, storedNumbers[i], component)[0:trajecLengths[i]]
+            stacked[i, 0:len(trajecData)] = trajecData
+        stacked.flush()
+        del stacked
+        os.replace(tempPath, storePath + "/" + component + ".npy")
+
+    with open(storePath + "/" + DATASET_KEY_FILE, 'w') as file:
+        json.dump({'trajec_numbers': storedNumbers, 'trajec_lengths': trajecLengths, 'keys': datasetKeys}, file)
+
+    return True
+
+def scanTrajecCSV(task, trajecNumber, component):
+    '''
+    Manifest entry for one csv file: shape, size, modification time and sha1 hash of the contents,
+    plus a description of any problem found ("" if none). The rows are checked without parsing.
+
+    '''
+    path = trajecPath(task, trajecNumber) + "/" + component + ".csv"
+    entry = csvCacheKey(task, trajecNumber, component)
+    with open(path, 'rb') as file:
+        contents = file.read()
+
+    entry['sha1'] = hashlib.sha1(contents).hexdigest()
+    entry['problem'] = ""
+
+    rows = 0
+    cols = 0
+    for line in contents.splitlines():
+        if not line.strip():
+            continue
+
+        # Every row ends in a trailing comma, which readTrajecCSVBlocks drops
+        if rows == 0:
+            cols = line.count(b',')
+        elif line.count(b',') != cols and not len(entry['problem']):
+            entry['problem'] = component + " row " + str(rows) + " has " + str(line.count(b',')) + " columns, expected " + str(cols)
+
+        if (line.startswith(b',') or b',,' in line) and not len(entry['problem']):
+            entry['problem'] = component + " row " + str(rows) + " has empty values"
+        rows += 1
+
+    if len(contents) and not contents.endswith(b'\n') and not len(entry['problem']):
+        entry['problem'] = component + " is truncated, last row is incomplete"
+
+    entry['rows'] = rows
+    entry['cols'] = cols
+    # The dtype the values parse to, integers unless any value has a decimal point, exponent, nan or inf
+    entry['dtype'] = None
+    if rows:
+        entry['dtype'] = "int64"
+        for marker in [b'.', b'e', b'E', b'n', b'N']:
+            if marker in contents:
+                entry['dtype'] = "float64"
+                break
+
+    return entry
+
+def checkTrajecEntries(descriptor, components):
+    # Problem with a trajectory given the manifest entries of its components, "" if it is valid
+    for component in TRAJEC_COMPONENTS:
+        if len(components[component]['problem']):
+            return components[component]['problem']
+
+    num_states = descriptor.dof_pos + descriptor.dof_vel
+    num_ctrl = components["controls"]['cols']
+    expectedColumns = {"A_matrices": num_states * num_states, "B_matrices": num_states * num_ctrl,
+                       "states": num_states, "controls": num_ctrl}
+    for component in TRAJEC_COMPONENTS:
+        if components[component]['cols'] != expectedColumns[component]:
+            return component + " has " + str(components[component]['cols']) + " columns, expected " + str(expectedColumns[component])
+
+    for component in TRAJEC_COMPONENTS:
+        if components[component]['rows'] != components["A_matrices"]['rows']:
+            return component + " has " + str(components[component]['rows']) + " rows but A_matrices has " + str(components["A_matrices"]['rows'])
+
+    return ""
+
+def buildTaskManifest(task, trajecNumbers = None):
+    '''
+    Scan the csv files of a task and write the manifest. Components whose csv file hasn't changed
+    since the last manifest are not scanned again.
+
+    Returns the manifest: {'trajectories': {trajecNumber: {'valid', 'problem', 'components'}}}
+
+    '''
+    if trajecNumbers is None:
+        trajecNumbers = returnTrajecNumbers(task)
+
+    descriptor = returnTaskDescriptor(task)
+    oldManifest = readTaskManifest(task)
+    manifest = {'task': task, 'trajectories': {}}
+
+    for trajecNumber in trajecNumbers:
+        components = {}
+        for component in TRAJEC_COMPONENTS:
+            entry = None
+            if oldManifest is not None and str(trajecNumber) in oldManifest['trajectories']:
+                entry = oldManifest['trajectories'][str(trajecNumber)]['components'][component]
+                if entry['size'] != csvCacheKey(task, trajecNumber, component)['size'] or entry['mtime_ns'] != csvCacheKey(task, trajecNumber, component)['mtime_ns']:
+                    entry = None
+
+            if entry is None:
+                entry = scanTrajecCSV(task, trajecNumber, component)
+            components[component] = entry
+
+        problem = checkTrajecEntries(descriptor, components)
+        manifest['trajectories'][str(trajecNumber)] = {'valid': not len(problem), 'problem': problem, 'components': components}
+
+    os.makedirs(datasetPath(task), exist_ok=True)
+    with open(datasetPath(task) + "/" + MANIFEST_FILE, 'w') as file:
+        json.dump(manifest, file)
+
+    return manifest
+
+# Loaded manifests, keyed on task name, along with the manifest file modification time they were loaded at
+taskManifests = {}
+
+def readTaskManifest(task):
+    '''
+    The manifest of a task, None if it hasn't been built
+
+    '''
+    try:
+        mtime = os.stat(datasetPath(task) + "/" + MANIFEST_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    if task not in taskManifests or taskManifests[task][0] != mtime:
+        with open(datasetPath(task) + "/" + MANIFEST_FILE, 'r') as file:
+            taskManifests[task] = (mtime, json.load(file))
+
+    return taskManifests[task][1]
+
+def manifestEntry(task, trajecNumber, component):
+    # Manifest entry of a csv file, None if there's no manifest or the file changed since it was scanned
+    manifest = readTaskManifest(task)
+    if manifest is None or str(trajecNumber) not in manifest['trajectories']:
+        return None
+
+    entry = manifest['trajectories'][str(trajecNumber)]['components'][component]
+    key = csvCacheKey(task, trajecNumber, component)
+    if entry['size'] != key['size'] or entry['mtime_ns'] != key['mtime_ns']:
+        return None
+
+    return entry
+
+def validateTrajec(task, trajecNumber):
+    '''
+    Raise a ValueError if the manifest marks the trajectory as invalid and its csv files haven't
+    changed since. Does nothing if there is no up to date manifest entry.
+
+    '''
+    manifest = readTaskManifest(task)
+    if manifest is None or str(trajecNumber) not in manifest['trajectories']:
+        return
+
+    trajecEntry = manifest['trajectories'][str(trajecNumber)]
+    for component in TRAJEC_COMPONENTS:
+        if manifestEntry(task, trajecNumber, component) is None:
+            return
+
+    if not trajecEntry['valid']:
+        raise ValueError("trajectory " + str(trajecNumber) + " of task " + task + " is invalid: " + trajecEntry['problem'])
+
+def validTrajecNumbers(task, trajecNumbers = None):
+    '''
+    The trajectory numbers the manifest doesn't mark as invalid, all of them if there is no manifest.
+    A warning is issued for every trajectory left out.
+
+    '''
+    if trajecNumbers is None:
+        trajecNumbers = returnTrajecNumbers(task)
+
+    validNumbers = []
+    for trajecNumber in trajecNumbers:
+        try:
+            validateTrajec(task, trajecNumber)
+            validNumbers.append(trajecNumber)
+        except ValueError as error:
+            warnings.warn("skipping " + str(error), stacklevel=2)
+
+    return validNumbers
+
+class taskDataset():
+    '''
+    Some saved trajectories of a task, indexed out of the memory-mapped stacked arrays of its store:
+
+    A_matrices: (N_stored, T, num_states, num_states)
+    B_matrices: (N_stored, T, num_states, num_ctrl)
+    states:     (N_stored, T, num_states)
+    controls:   (N_stored, T, num_ctrl)
+
+    where N_stored is the number of trajectories in the store and T the longest of their lengths.
+    trajecIndex maps each trajectory of the dataset to its row and trajecLengths holds the real
+    length of every row. Nothing is read from disk until it is indexed.
+
+    '''
+    def __init__(self, task, trajecNumbers = None):
+        self.task = task
+        if trajecNumbers is None:
+            trajecNumbers = returnTrajecNumbers(task)
+        self.trajecNumbers = list(trajecNumbers)
+        buildTaskDataset(task, self.trajecNumbers)
+
+        datasetInfo = readDatasetInfo(task)
+        self.trajecLengths = np.array(datasetInfo['trajec_lengths'])
+        self.numTrajectories = len(self.trajecNumbers)
+        self.trajecIndex = {}
+        for trajecNumber in self.trajecNumbers:
+            self.trajecIndex[trajecNumber] = datasetInfo['trajec_numbers'].index(trajecNumber)
+
+        self.flatComponents = {}
+        for component in TRAJEC_COMPONENTS:
+            self.flatComponents[component] = np.load(datasetPath(task) + "/" + component + ".npy", mmap_mode='r')
+
+        self.num_states = int(round(math.sqrt(self.flatComponents["A_matrices"].shape[2])))
+        self.num_ctrl = self.flatComponents["controls"].shape[2]
+        numStored, maxLength = self.flatComponents["A_matrices"].shape[0:2]
+
+        self.A_matrices = self.flatComponents["A_matrices"].reshape(
+            (numStored, maxLength, self.num_states, self.num_states))
+        self.B_matrices = self.flatComponents["B_matrices"].reshape(
+            (numStored, maxLength, self.num_states, self.num_ctrl))
+        self.states = self.flatComponents["states"]
+        self.controls = self.flatComponents["controls"]
+
+    def trajecComponent(self, trajecNumber, component):
+        '''
+        Memory-mapped (T, columns) view of one component of one trajectory, cut to its real length
+
+        '''
+        index = self.trajecIndex[trajecNumber]
+        return self.flatComponents[component][index, 0:self.trajecLengths[index]]
+
+if __name__ == "__main__":
+    # Build the stacked dataset of the valid trajectories of the given tasks, or of every task in savedTrajecInfo
+    tasks = sys.argv[1:]
+    if not len(tasks):
+        tasks = sorted(os.listdir("savedTrajecInfo"))
+
+    for task in tasks:
+        manifest = buildTaskManifest(task)
+        validNumbers = []
+        for trajecNumber in manifest['trajectories']:
+            if manifest['trajectories'][trajecNumber]['valid']:
+                validNumbers.append(int(trajecNumber))
+            else:
+                print(task + " trajectory " + trajecNumber + " is invalid: " + manifest['trajectories'][trajecNumber]['problem'])
+
+        if buildTaskDataset(task, validNumbers):
+            print(task + ": stacked dataset written")